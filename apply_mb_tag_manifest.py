@@ -0,0 +1,117 @@
+# /// script
+# requires-python = ">=3.8"
+# dependencies = [
+#     "mutagen",
+# ]
+# ///
+
+import os
+import csv
+import sys
+import json
+import argparse
+from mutagen.easyid3 import EasyID3
+from mb_tag_core import (update_audio_tags, update_video_tags, report_rewrite, submit, count,
+                         add_arguments, configure, finish, MP4_INDEX_NAMES)
+
+# Bulk-applies tag values from a manifest, for changes no filename rule
+# describes (a new comment text, Phrase Vault parts moved to another album):
+#
+#   CSV, one column per field:  path,album,comment
+#                               Phrase Vault/PV_001.mp3,mbPV Part 1,
+#   CSV, one row per field:     path,field,value
+#   JSONL:                      {"path": "Phrase Vault/PV_001.mp3", "album": "mbPV Part 1"}
+#
+# Relative paths are taken from scan_dir. An empty CSV cell assigns nothing;
+# an empty value in a path,field,value row or in JSONL removes the field.
+# All assignments of a file are merged into one write, and a file that
+# already holds the values is skipped by the same compare (and scan cache)
+# the update scripts use. MP3 fields are EasyID3 names (title, album,
+# artist, genre, tracknumber, ...) plus comment; MP4 files take title,
+# album, artist, genre and comment.
+
+VIDEO_EXTENSIONS = ('.mp4',)
+MP4_ATOMS = {name: atom for atom, name in MP4_INDEX_NAMES.items()}
+
+
+def read_rows(path):
+    """Yield (path, field, value) assignments from a CSV or JSONL manifest, in file order."""
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        if path.lower().endswith(('.jsonl', '.json')):
+            for line in f:
+                if line.strip():
+                    row = json.loads(line)
+                    for field, value in row.items():
+                        if field != "path":
+                            yield row["path"], field, value
+            return
+        reader = csv.DictReader(f)
+        if reader.fieldnames == ["path", "field", "value"]:
+            for row in reader:
+                yield row["path"], row["field"], row["value"]
+            return
+        for row in reader:
+            for field, value in row.items():
+                if field != "path" and value:
+                    yield row["path"], field, value
+
+
+def field_error(full_path, field):
+    if full_path.lower().endswith(VIDEO_EXTENSIONS):
+        return None if field in MP4_ATOMS else f"MP4 files take {', '.join(MP4_ATOMS)}"
+    return None if field == "comment" or field in EasyID3.Set else "not an EasyID3 field or comment"
+
+
+def load_manifest(path, scan_dir):
+    """Merge the manifest per file: {full_path: {field: value}}, in manifest order; later rows win."""
+    manifest = {}
+    errors = 0
+    for file, field, value in read_rows(path):
+        full_path = os.path.abspath(os.path.join(scan_dir, file))
+        error = field_error(full_path, field)
+        if error:
+            print(f"#### --- Ignoring [{field}] of [{file}]: {error}")
+            errors += 1
+            continue
+        assigned = manifest.setdefault(full_path, {})
+        if assigned.get(field, value) != value:
+            print(f"#### --- [{file}] assigns [{field}] twice: [{assigned[field]}], then [{value}]; keeping the last")
+        assigned[field] = "" if value is None else str(value)
+    return manifest, errors
+
+
+def apply_file(full_path, assigned):
+    file = os.path.basename(full_path)
+    if not os.path.exists(full_path):
+        print(f"#### --- Skipping [{full_path}]: file not found")
+        count("skipped")
+        return
+
+    if full_path.lower().endswith(VIDEO_EXTENSIONS):
+        result = update_video_tags(full_path, {MP4_ATOMS[field]: value for field, value in assigned.items()})
+    else:
+        tags = {field: value for field, value in assigned.items() if field != "comment"}
+        result = update_audio_tags(full_path, tags, assigned.get("comment"))
+
+    if result["changes"]:
+        print(f"--> UPDATED [{file}]")
+        report_rewrite(file, result)
+    else:
+        print(f"-- No change [{file}]")
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser()
+    p.add_argument("manifest", help="CSV or JSONL file of path -> tag values", type=str)
+    p.add_argument("scan_dir", help="library folder the manifest paths are relative to", nargs="?", default='.', type=str)
+    add_arguments(p)
+    args = p.parse_args()
+    configure(args, "manifest")
+
+    manifest, errors = load_manifest(args.manifest, args.scan_dir)
+    print(f"Applying manifest [{args.manifest}]: {len(manifest)} file(s)...")
+    for full_path, assigned in manifest.items():
+        submit(apply_file, full_path, assigned)
+
+    finish()
+    if errors:
+        sys.exit(1)
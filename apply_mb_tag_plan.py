@@ -0,0 +1,52 @@
+import os
+import json
+import argparse
+from mb_tag_core import apply_planned_changes, report_rewrite, submit, configure, finish
+
+# Applies a plan written by an update_mb_*_tags.py script run with --plan:
+# all changes of a file are written with one save, and only the files
+# listed in the plan are opened.
+
+def load_plan(path):
+    """Group the plan lines per file: {full_path: (kind, [(field, old, new), ...])}, in plan order."""
+    plan = {}
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            row = json.loads(line)
+            kind, changes = plan.setdefault(row["path"], (row["kind"], []))
+            changes.append((row["field"], row["old"], row["new"]))
+    return plan
+
+def apply_file(full_path, kind, changes):
+    if not os.path.exists(full_path):
+        print(f"#### --- Skipping [{full_path}]: file not found")
+        return
+    if kind == "artwork":
+        # the plan holds the image hashes only, not the images
+        print(f"#### --- Skipping [{full_path}]: cover art is embedded by update_mb_artwork.py")
+        return
+
+    result = apply_planned_changes(full_path, kind, changes)
+    if result["stale"]:
+        print(f"#### --- Skipping [{full_path}]: changed since the plan was made")
+    elif result["writes"]:
+        print(f"--> UPDATED [{full_path}]")
+        report_rewrite(full_path, result)
+    else:
+        print(f"-- No change [{full_path}]")
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser()
+    p.add_argument("plan_path", help="JSONL plan written by an update script with --plan", metavar="plan", type=str)
+    p.add_argument("--jobs", help="number of files to process in parallel", default=1, type=int)
+    args = p.parse_args()
+    configure(args, "plan")
+
+    plan = load_plan(args.plan_path)
+    print(f"Applying plan [{args.plan_path}]: {len(plan)} file(s)...")
+    for full_path, (kind, changes) in plan.items():
+        submit(apply_file, full_path, kind, changes)
+
+    finish()
@@ -0,0 +1,69 @@
+import os
+import time
+import random
+import argparse
+from mb_classifier import classify_listing, compile_story_patterns
+
+# Micro-benchmark for mb_classifier: classifies synthetic Mandarin Blueprint
+# filenames of every rule set, a directory listing at a time.
+
+SUBJECTS = ["Asking_for_Directions", "Leisure_Hobbies", "Ordering_Food", "Small_Talk", "Weather"]
+ALBUMS = ["IMMERSION", "LLR", "TAP"]
+STORY_TITLES = ["Honesty - Paragraph #1", "Honesty - Paragraph 1"]
+
+def synthetic_name(rng, level):
+    kind = rng.randrange(7)
+    subject = rng.choice(SUBJECTS)
+    album = rng.choice(ALBUMS)
+    if kind == 0:
+        return f"{subject}_Part_{rng.randint(1, 9)}_{album}_MANDARIN_BLUEPRINT.mp3"
+    if kind == 1:
+        return f"MSLK_Lesson_{rng.randint(1, 40):02d}_{album}_MANDARIN_BLUEPRINT.mp3"
+    if kind == 2:
+        return f"SAI-{subject}-Part{rng.randint(1, 9)}-JanVanDerWatt.mp3"
+    if kind == 3:
+        return f"L{level} All Sentences Combined.mp3"
+    if kind == 4:
+        gender = rng.choice(["Male", "Female"])
+        speed = rng.choice(["Slower", "Native Speed"])
+        return f"AUDIO - {rng.choice(STORY_TITLES)} - {gender} ({speed}).mp3"
+    if kind == 5:
+        return f"VIDEO {rng.choice(['MALE', 'FEMALE'])} - {rng.choice(STORY_TITLES)}.mp4"
+    return f"cover {rng.randint(1, 999)}.jpg"
+
+def make_listings(count, per_dir, seed=1):
+    """Build [(dirpath, names), ...] holding count synthetic filenames."""
+    rng = random.Random(seed)
+    listings = []
+    for start in range(0, count, per_dir):
+        level = str(rng.randint(1, 60))
+        dirpath = os.path.join("mandarin blueprint", f"mbP{rng.randint(1, 6)}L{level}")
+        names = [synthetic_name(rng, level) for _ in range(min(per_dir, count - start))]
+        listings.append((dirpath, names))
+    return listings
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser()
+    p.add_argument("--count", help="number of filenames to classify", default=100000, type=int)
+    p.add_argument("--per-dir", help="filenames per directory listing", default=100, type=int)
+    p.add_argument("--repeat", help="number of timed runs (the best is reported)", default=3, type=int)
+    args = p.parse_args()
+
+    listings = make_listings(args.count, args.per_dir)
+    stories = [compile_story_patterns(STORY_TITLES)]
+
+    best = None
+    for _ in range(args.repeat):
+        rule_counts = {}
+        started = time.perf_counter()
+        for dirpath, names in listings:
+            for name, matches in classify_listing(dirpath, names, stories):
+                for match in matches:
+                    rule_counts[match.rule] = rule_counts.get(match.rule, 0) + 1
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+
+    print(f"Classified {args.count} filenames in {len(listings)} listings")
+    for rule, n in sorted(rule_counts.items()):
+        print(f"{rule}: {n}")
+    print(f"Best of {args.repeat}: {best:.3f} s, {args.count / best:,.0f} filenames/s")
@@ -0,0 +1,63 @@
+import os
+import time
+import shutil
+import argparse
+import tempfile
+import mb_tag_core
+from mb_tag_core import update_audio_tags
+from mb_synthetic_library import MP3_FRAME
+
+# Benchmark of the no-change case: every synthetic MP3 already carries the
+# expected Phrase Vault tags, and each run checks them all again without the
+# scan cache, once with the mb_id3_fast byte-level check and once with a full
+# mutagen parse only.
+
+COMMENT_TEXT = "The Phrase Vault"
+
+def expected_tags(i):
+    return {
+        'title': f"Synthetic Phrase {i}",
+        'discsubtitle': "Part 1",
+        'discnumber': "1",
+        'album': "LLR",
+        'artist': "Mandarin Blueprint",
+        'genre': "Language Learning"
+    }
+
+def make_library(path, count, frames):
+    """Write count tagged MP3 files; returns [(full_path, expected_tags), ...]."""
+    files = []
+    for i in range(count):
+        full_path = os.path.join(path, f"Synthetic_Phrase_{i}_LLR_MANDARIN_BLUEPRINT.mp3")
+        with open(full_path, 'wb') as f:
+            f.write(MP3_FRAME * frames)
+        update_audio_tags(full_path, expected_tags(i), COMMENT_TEXT)
+        files.append((full_path, expected_tags(i)))
+    return files
+
+def run(files, fast_path):
+    mb_tag_core.fast_path = fast_path
+    started = time.perf_counter()
+    for full_path, tags in files:
+        result = update_audio_tags(full_path, tags, COMMENT_TEXT)
+        assert not result["changes"], full_path
+    return time.perf_counter() - started
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser()
+    p.add_argument("--count", help="number of MP3 files", default=2000, type=int)
+    p.add_argument("--frames", help="MP3 frames of audio per file", default=40, type=int)
+    p.add_argument("--repeat", help="number of timed runs (the best is reported)", default=3, type=int)
+    p.add_argument("--dir", help="folder for the synthetic files (default: a temporary folder)", default=None, type=str)
+    args = p.parse_args()
+
+    path = args.dir or tempfile.mkdtemp(prefix="mb_bench_")
+    os.makedirs(path, exist_ok=True)
+    try:
+        files = make_library(path, args.count, args.frames)
+        for label, fast_path in (("mutagen parse", False), ("byte-level fast path", True)):
+            best = min(run(files, fast_path) for _ in range(args.repeat))
+            print(f"{label}: best of {args.repeat}: {best:.3f} s, {args.count / best:,.0f} files/s")
+    finally:
+        if args.dir is None:
+            shutil.rmtree(path)
@@ -0,0 +1,62 @@
+import os
+import time
+import shutil
+import argparse
+import tempfile
+from mutagen.mp4 import MP4
+from mb_tag_core import save_mp4
+from mb_synthetic_library import write_mp4
+
+# Measures the bytes written per story video tag update: a sequence of
+# updates (first tags, a title change, a longer title, a much longer title)
+# is saved with save_mp4 on a synthetic video of --size MB, showing which
+# saves fit in place and which rewrite the video.
+
+TAGS = {
+    '\xa9nam': "诚实 - Paragraph #1 - 女",
+    '\xa9alb': "mbP5L36",
+    '\xa9ART': "Mandarin Blueprint",
+    '\xa9gen': "Language Learning",
+    '\xa9cmt': "The Mandarin Blueprint Method",
+}
+
+UPDATES = [
+    ("first tags", TAGS),
+    ("title change", dict(TAGS, **{'\xa9nam': "诚实 - Paragraph #2 - 男"})),
+    ("title +200 chars", dict(TAGS, **{'\xa9nam': "诚实 - Paragraph #2 - 男 " + "x" * 200})),
+    ("title +5000 chars", dict(TAGS, **{'\xa9nam': "诚实 - Paragraph #2 - 男 " + "x" * 5000})),
+]
+
+def run(path):
+    rows = []
+    for label, tags in UPDATES:
+        video = MP4(path)
+        for key, value in tags.items():
+            video[key] = value
+        started = time.perf_counter()
+        in_place, bytes_written = save_mp4(video, path)
+        rows.append((label, in_place, bytes_written, time.perf_counter() - started))
+    return rows
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser()
+    p.add_argument("--size", help="size of the synthetic video in MB", default=200, type=int)
+    p.add_argument("--dir", help="folder for the synthetic video (default: a temporary folder)", default=None, type=str)
+    args = p.parse_args()
+
+    path_dir = args.dir or tempfile.mkdtemp(prefix="mb_bench_")
+    os.makedirs(path_dir, exist_ok=True)
+    try:
+        path = os.path.join(path_dir, "VIDEO FEMALE - Honesty - Paragraph 1.mp4")
+        write_mp4(path, args.size * 1024 * 1024)
+        print(f">> ------- {args.size} MB video -------")
+        total = 0
+        for update, in_place, bytes_written, elapsed in run(path):
+            total += bytes_written
+            how = "in place" if in_place else "rewritten"
+            print(f"{update:<18} {how:<10} {bytes_written:>14,} bytes  {elapsed:8.3f} s")
+        print(f"{'total':<29} {total:>14,} bytes, {total // len(UPDATES):,} bytes per update")
+        os.remove(path)
+    finally:
+        if args.dir is None:
+            shutil.rmtree(path_dir)
@@ -0,0 +1,123 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+from mb_synthetic_library import generate
+
+# Benchmark harness for the update scripts. A synthetic library is generated
+# once; every script then gets its own copy and is run three times:
+#
+#   cold   untagged files, no scan cache: every file is parsed and written
+#   no-op  the same files, now tagged, with an empty scan cache: every file is checked
+#   warm   tagged files with the scan cache filled by the no-op run: stat only
+#
+# With --jobs 1,2,4,8 the three runs are repeated on a fresh copy for every
+# worker count, to show how tagging scales with --jobs. The numbers come
+# from the --metrics file each run writes.
+
+SCRIPTS = {
+    "tpv": "update_mb_tpv_tags.py",
+    "mslk": "update_mb_mslk_tags.py",
+    "li": "update_mb_li_tags.py",
+    "sentence": "update_mb_sentence_tags.py",
+    "story": "update_mb_story_tags.py",
+    "all": "update_mb_all_tags.py",
+}
+
+RUNS = [("cold", ["--no-cache"]), ("no-op", []), ("warm", [])]
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def run_script(script, scan_dir, extra, metrics_path):
+    """Run one update script quietly; returns its metrics plus the wall time including start-up."""
+    command = [sys.executable, os.path.join(SCRIPT_DIR, script), scan_dir, "--quiet", "--metrics", metrics_path] + extra
+    started = time.perf_counter()
+    subprocess.run(command, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    wall = time.perf_counter() - started
+    with open(metrics_path, encoding='utf-8') as f:
+        metrics = json.load(f)
+    metrics["wall"] = round(wall, 3)
+    return metrics
+
+def bench_script(name, template, work_dir, jobs):
+    scan_dir = os.path.join(work_dir, name)
+    shutil.copytree(template, scan_dir)
+    results = []
+    for run, run_extra in RUNS:
+        metrics = run_script(SCRIPTS[name], scan_dir, run_extra + ["--jobs", str(jobs)],
+                             os.path.join(work_dir, f"{name}-{run}-{jobs}.json"))
+        counters = metrics["counters"]
+        results.append({
+            "script": name,
+            "run": run,
+            "jobs": jobs,
+            "files": counters["files"],
+            "writes": counters["writes"],
+            "bytes_written": counters["bytes_written"],
+            "elapsed": metrics["elapsed"],
+            "wall": metrics["wall"],
+            "files_per_s": round(counters["files"] / metrics["elapsed"], 1) if metrics["elapsed"] else None,
+            "phases": metrics["phases"],
+        })
+    shutil.rmtree(scan_dir)
+    return results
+
+def print_table(results):
+    print(f"{'script':<9}{'run':<7}{'jobs':>5}{'files':>7}{'writes':>8}{'bytes written':>15}{'elapsed s':>11}{'files/s':>10}{'wall s':>8}")
+    for r in results:
+        print(f"{r['script']:<9}{r['run']:<7}{r['jobs']:>5}{r['files']:>7}{r['writes']:>8}{r['bytes_written']:>15,}"
+              f"{r['elapsed']:>11.3f}{r['files_per_s'] or 0:>10,.0f}{r['wall']:>8.2f}")
+
+def scaling(results):
+    """Return {(script, run): {jobs: files/s}} in run order."""
+    table = {}
+    for r in results:
+        table.setdefault((r["script"], r["run"]), {})[r["jobs"]] = r["files_per_s"]
+    return table
+
+def print_scaling(results, job_counts):
+    print(">> ------- files/s by --jobs -------")
+    print(f"{'script':<9}{'run':<7}" + "".join(f"{f'jobs {n}':>10}" for n in job_counts))
+    for (script, run), rates in scaling(results).items():
+        print(f"{script:<9}{run:<7}" + "".join(f"{rates[n]:>10,.0f}" if rates.get(n) else f"{'-':>10}" for n in job_counts))
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser()
+    p.add_argument("--scale", help="size of the synthetic library (see mb_synthetic_library.py)", default=4, type=int)
+    p.add_argument("--frames", help="MP3 frames of audio per file", default=40, type=int)
+    p.add_argument("--scripts", help="comma separated scripts to run", default=",".join(SCRIPTS), type=str)
+    p.add_argument("--jobs", help="comma separated worker counts to run every script with, e.g. 1,2,4,8", default="1", type=str)
+    p.add_argument("--output", help="also write the results to this JSON file", default=None, type=str)
+    p.add_argument("--dir", help="work folder (default: a temporary folder, removed afterwards)", default=None, type=str)
+    args = p.parse_args()
+    job_counts = [int(n) for n in args.jobs.split(",")]
+
+    work_dir = args.dir or tempfile.mkdtemp(prefix="mb_bench_")
+    try:
+        # the folder name matters: the level rules look for ...\mandarin blueprint\mbP<p>L<l>
+        template = os.path.join(work_dir, "template")
+        counts = generate(template, args.scale, args.frames)
+        print(f"Synthetic library: {sum(counts.values())} media files (scale {args.scale}), "
+              + ", ".join(f"{rule} {n}" for rule, n in counts.items()))
+
+        results = []
+        for name in args.scripts.split(","):
+            for jobs in job_counts:
+                results.extend(bench_script(name.strip(), template, work_dir, jobs))
+        print_table(results)
+        if len(job_counts) > 1:
+            print_scaling(results, job_counts)
+
+        if args.output:
+            files_per_s = [{"script": script, "run": run, "files_per_s": {str(n): rate for n, rate in rates.items()}}
+                           for (script, run), rates in scaling(results).items()]
+            with open(args.output, 'w', encoding='utf-8') as f:
+                json.dump({"scale": args.scale, "frames": args.frames, "jobs": job_counts, "results": results,
+                           "scaling": files_per_s}, f, indent=2)
+    finally:
+        if args.dir is None:
+            shutil.rmtree(work_dir)
@@ -1,57 +1,100 @@
 import os
+import csv
+import json
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
 from mutagen.id3 import ID3, ID3NoHeaderError
 from mutagen.easyid3 import EasyID3
 from mutagen import File
 from mutagen._constants import GENRES
 from collections import defaultdict
 import argparse
+import mb_profile
+from mb_scan_cache import CACHE_FILE_NAME
+from mb_mp3_duration import DurationStore
+
+# Prints the tags of every MP3 file of a folder, or with --export writes one
+# inventory record per file (tags, raw frames, duration, bitrate) to a CSV,
+# JSONL or SQLite file. Each file is parsed once; with --jobs the files are
+# parsed in parallel and the records are streamed out in walk order.
+# --exact-duration replaces mutagen's length and bitrate estimate of MP3
+# files with a count of their MPEG frames (see mb_mp3_duration.py), kept in
+# the scan cache per audio content so each recording is scanned once.
+
+AUDIO_EXTENSIONS = ('.mp3', '.mp2', '.mp1')
+VIDEO_EXTENSIONS = ('.mp4', '.m4a')
+
+# tags exported as their own column, by EasyID3 name
+TAG_FIELDS = ["title", "album", "artist", "genre", "discnumber", "discsubtitle", "tracknumber", "comment"]
+# iTunes atoms of MP4 files, by the same names
+MP4_FIELDS = {"\xa9nam": "title", "\xa9alb": "album", "\xa9ART": "artist", "\xa9gen": "genre",
+              "disk": "discnumber", "trkn": "tracknumber", "\xa9cmt": "comment"}
+
+COLUMNS = (["path", "size", "mtime_ns", "mime", "length", "bitrate", "sample_rate", "channels", "tag_version"]
+           + TAG_FIELDS + ["frames", "error", "audio_frames", "vbr"])
+
+durations = None  # DurationStore, with --exact-duration
 
 def get_all_tags(filepath):
-    """Get all available tags from an audio file"""
-    try:
-        # Get EasyID3 tags (simplified interface)
-        easy_tags = EasyID3(filepath)
-    except:
-        easy_tags = None
-    
+    """Get all available tags from an audio file, parsing it once.
+
+    Returns (easy_tags, id3_tags, audio): a dict of EasyID3 fields, the raw
+    ID3 tag and the mutagen File (None for each that is not available).
+    """
     try:
-        # Get raw ID3 frames
-        id3_tags = ID3(filepath)
-    except ID3NoHeaderError:
-        id3_tags = None
-    
-    return easy_tags, id3_tags
+        audio = File(filepath)
+    except Exception:
+        audio = None
+
+    id3_tags = audio.tags if audio is not None and isinstance(audio.tags, ID3) else None
+    if id3_tags is None and audio is None:
+        try:
+            # not an audio stream mutagen recognises, but it may still carry an ID3 tag
+            id3_tags = ID3(filepath)
+        except ID3NoHeaderError:
+            id3_tags = None
+
+    easy_tags = None
+    if id3_tags is not None:
+        easy_tags = {}
+        for key, getter in EasyID3.Get.items():
+            try:
+                easy_tags[key] = getter(id3_tags, key)
+            except KeyError:
+                pass
+    return easy_tags, id3_tags, audio
+
+def frame_text(frame):
+    # Get text value safely
+    raw_text = getattr(frame, 'text', str(frame))
+    if isinstance(raw_text, list):
+        return str(raw_text[0]) if raw_text else ''
+    return str(raw_text)
 
 def display_tag_info(filepath):
     """Display complete tag information for a file"""
     print(f"\n=== Analyzing: {os.path.basename(filepath)} ===")
-    
+
     # Get both types of tags
-    easy_tags, id3_tags = get_all_tags(filepath)
-    
+    easy_tags, id3_tags, audio = get_all_tags(filepath)
+
     # Display EasyID3 tags if available
     if easy_tags:
         print("\n[Standard Tags (EasyID3)]")
         for key, value in easy_tags.items():
             print(f"{key.upper():<15}: {value}")
-    
+
     # Display raw ID3 frames if available
     if id3_tags:
         print("\n[Raw ID3 Frames]")
         for frame in id3_tags.values():
             frame_id = frame.FrameID
-            # Get text value safely
-            raw_text = getattr(frame, 'text', str(frame))
-            if isinstance(raw_text, list):
-                text = str(raw_text[0]) if raw_text else ''
-            else:
-                text = str(raw_text)
-                        
+            text = frame_text(frame)
             print(f"{frame_id:<5} ({frame.__class__.__name__}): {text[:80]}{'...' if len(str(text)) > 80 else ''}")
-    
+
     # Display file extensions and technical info
     print("\n[Technical Information]")
-    audio = File(filepath)
     if audio:
         print(f"File Type: {audio.mime[0]}")
         print(f"Length: {audio.info.length:.2f} seconds")
@@ -60,25 +103,190 @@ def display_tag_info(filepath):
             print(f"Sample Rate: {audio.info.sample_rate} Hz")
         if hasattr(audio.info, 'channels'):
             print(f"Channels: {audio.info.channels}")
+    if durations is not None and filepath.lower().endswith(AUDIO_EXTENSIONS):
+        exact = durations.duration(filepath)
+        if exact is not None:
+            print(f"Exact Length: {exact.length:.3f} seconds ({exact.frames} frames)")
+            print(f"Average Bitrate: {exact.bitrate} bps{' (VBR)' if exact.vbr else ''}")
+
+def mp4_value(value):
+    """Text of an MP4 atom value: first item, (number, total) pairs as 'number/total'."""
+    if isinstance(value, list):
+        value = value[0] if value else ''
+    if isinstance(value, tuple):
+        return "/".join(str(v) for v in value if v)
+    return str(value)
+
+def inventory_record(filepath):
+    """Build the inventory record of one file from a single parse; never raises."""
+    record = dict.fromkeys(COLUMNS)
+    record["path"] = filepath
+    record["frames"] = []
+    try:
+        st = os.stat(filepath)
+        record["size"], record["mtime_ns"] = st.st_size, st.st_mtime_ns
+
+        easy_tags, id3_tags, audio = get_all_tags(filepath)
+        if audio is not None:
+            record["mime"] = audio.mime[0]
+            record["length"] = round(audio.info.length, 3)
+            record["bitrate"] = getattr(audio.info, 'bitrate', None)
+            record["sample_rate"] = getattr(audio.info, 'sample_rate', None)
+            record["channels"] = getattr(audio.info, 'channels', None)
+        if durations is not None and filepath.lower().endswith(AUDIO_EXTENSIONS):
+            exact = durations.duration(filepath, st)
+            if exact is not None:
+                record["length"], record["bitrate"] = round(exact.length, 3), exact.bitrate
+                record["sample_rate"], record["audio_frames"], record["vbr"] = exact.sample_rate, exact.frames, exact.vbr
+
+        if id3_tags is not None:
+            record["tag_version"] = "ID3v2.%d" % id3_tags.version[1]
+            for key in TAG_FIELDS:
+                if easy_tags.get(key):
+                    record[key] = easy_tags[key][0]
+            for frame in id3_tags.getall("COMM")[:1]:
+                record["comment"] = "/".join(frame.text)
+            record["frames"] = [[frame.FrameID, frame_text(frame)] for frame in id3_tags.values()]
+        elif audio is not None and audio.tags is not None:
+            record["tag_version"] = type(audio.tags).__name__
+            for atom, value in audio.tags.items():
+                if atom in MP4_FIELDS:
+                    record[MP4_FIELDS[atom]] = mp4_value(value)
+                record["frames"].append([atom, mp4_value(value)])
+    except Exception as e:
+        record["error"] = f"{type(e).__name__}: {e}"
+    return record
+
+class CsvExport:
+    def __init__(self, path):
+        self.file = open(path, 'w', encoding='utf-8', newline='')
+        self.writer = csv.DictWriter(self.file, fieldnames=COLUMNS)
+        self.writer.writeheader()
+
+    def write(self, record):
+        self.writer.writerow(dict(record, frames=json.dumps(record["frames"], ensure_ascii=False)))
+
+    def close(self):
+        self.file.close()
+
+class JsonlExport:
+    def __init__(self, path):
+        self.file = open(path, 'w', encoding='utf-8')
+
+    def write(self, record):
+        self.file.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def close(self):
+        self.file.close()
+
+class SqliteExport:
+    """Writes the records to a 'files' table, replacing the rows of files seen before."""
+
+    def __init__(self, path):
+        self.db = sqlite3.connect(path)
+        self.db.execute(f"CREATE TABLE IF NOT EXISTS files ({', '.join(COLUMNS)}, PRIMARY KEY (path))")
+        existing = {row[1] for row in self.db.execute("PRAGMA table_info(files)")}
+        for column in COLUMNS:
+            if column not in existing:  # an inventory exported by an older version
+                self.db.execute(f"ALTER TABLE files ADD COLUMN {column}")
+        self.pending = 0
+
+    def write(self, record):
+        record = dict(record, frames=json.dumps(record["frames"], ensure_ascii=False))
+        self.db.execute(f"INSERT OR REPLACE INTO files ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})",
+                        [record[column] for column in COLUMNS])
+        self.pending += 1
+        if self.pending >= 500:
+            self.db.commit()
+            self.pending = 0
+
+    def close(self):
+        self.db.commit()
+        self.db.close()
+
+EXPORTS = {"csv": CsvExport, "jsonl": JsonlExport, "sqlite": SqliteExport}
+
+def export_format(path, fmt=None):
+    """The export format named by --format, or else by the extension of the export file."""
+    if fmt:
+        return fmt
+    ext = os.path.splitext(path)[1].lower().lstrip('.')
+    return {"db": "sqlite", "sqlite3": "sqlite", "json": "jsonl"}.get(ext, ext if ext in EXPORTS else "jsonl")
+
+def walk_files(directory, extensions):
+    """Yield the files with the given extensions, one directory at a time."""
+    for root, dirs, files in os.walk(directory):
+        dirs[:] = [d for d in dirs if d != ".git"]
+        for file in sorted(files):
+            if file.lower().endswith(extensions):
+                yield os.path.join(root, file)
+
+def export_inventory(directory, export, jobs=1):
+    """Stream an inventory record of every audio and video file to export; returns (files, errors)."""
+    files = errors = 0
+    paths = walk_files(directory, AUDIO_EXTENSIONS + VIDEO_EXTENSIONS)
+    if jobs > 1:
+        # keep a bounded window of parses in flight; records are written in walk order
+        with ThreadPoolExecutor(max_workers=jobs) as pool:
+            pending = deque()
+            for path in paths:
+                pending.append(pool.submit(mb_profile.call, inventory_record, path))
+                if len(pending) > jobs * 4:
+                    record = pending.popleft().result()
+                    export.write(record)
+                    files, errors = files + 1, errors + bool(record["error"])
+            while pending:
+                record = pending.popleft().result()
+                export.write(record)
+                files, errors = files + 1, errors + bool(record["error"])
+    else:
+        for path in paths:
+            record = mb_profile.call(inventory_record, path)
+            export.write(record)
+            files, errors = files + 1, errors + bool(record["error"])
+    return files, errors
 
 def scan_directory(directory):
     """Scan a directory for MP3 files and analyze their tags"""
-    supported_extensions = ('.mp3', '.mp2', '.mp1')
+    supported_extensions = AUDIO_EXTENSIONS
     mp3_files = []
-    
+
     for root, _, files in os.walk(directory):
         for file in files:
             if file.lower().endswith(supported_extensions):
                 mp3_files.append(os.path.join(root, file))
-    
+
     print(f"Found {len(mp3_files)} MP3 files in directory")
     return mp3_files
 
 if __name__ == "__main__":
     p = argparse.ArgumentParser()
     p.add_argument("scan_dir", help="folder to scan for MP3 files", nargs="?", default='.', type=str)
+    p.add_argument("--export", help="write one record per MP3/MP4 file to this file instead of printing", default=None, type=str)
+    p.add_argument("--format", help="export format (default: from the export file extension)", choices=sorted(EXPORTS), default=None)
+    p.add_argument("--jobs", help="number of files to parse in parallel", default=1, type=int)
+    p.add_argument("--exact-duration", help="count the MPEG frames of MP3 files for their exact length and bitrate", action="store_true")
+    p.add_argument("--cache", help=f"scan cache file to keep the --exact-duration results in (default: <scan_dir>/{CACHE_FILE_NAME})", default=None, type=str)
+    mb_profile.add_arguments(p)
     args = p.parse_args()
+    mb_profile.start(args)
+    if args.exact_duration:
+        durations = DurationStore(args.cache or os.path.join(args.scan_dir, CACHE_FILE_NAME))
 
-    files = scan_directory(args.scan_dir)
-    for file in files:
-        display_tag_info(file)
+    if args.export:
+        fmt = export_format(args.export, args.format)
+        export = EXPORTS[fmt](args.export)
+        try:
+            files, errors = export_inventory(args.scan_dir, export, max(1, args.jobs))
+        finally:
+            export.close()
+        print(f"Exported {files} file(s) to [{args.export}] as {fmt}, {errors} could not be read")
+    else:
+        files = scan_directory(args.scan_dir)
+        for file in files:
+            mb_profile.call(display_tag_info, file)
+    if durations is not None:
+        durations.close()
+        print(f"Exact durations: {durations.scanned} file(s) scanned ({durations.bytes_scanned:,} bytes), "
+              f"{durations.durations_reused} reused from the cache")
+    mb_profile.report()
@@ -0,0 +1,57 @@
+import os
+import json
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from mb_scan_cache import CACHE_FILE_NAME
+from mb_fingerprint import FingerprintStore, find_duplicates, MP3_EXTENSIONS, MP4_EXTENSIONS
+from mb_tag_core import walk_library
+
+# Finds media files that hold the same audio/video under different folders or
+# names (re-downloaded Phrase Vault parts, story paragraphs copied into Full
+# Story folders, ...), comparing the payload without the tags, and reports
+# each group with the bytes a single copy would save. The fingerprints are
+# kept in the scan cache, where the update scripts pick up the duplicate
+# files: a duplicate whose tag equals that of a copy already tagged in the
+# same run reuses its result instead of being parsed and diffed again.
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser()
+    p.add_argument("scan_dir", help="library folder to search for duplicate MP3 and MP4 files", nargs="?", default='.', type=str)
+    p.add_argument("--cache", help=f"scan cache file to keep the fingerprints in (default: <scan_dir>/{CACHE_FILE_NAME})", default=None, type=str)
+    p.add_argument("--jobs", help="number of files to fingerprint in parallel", default=1, type=int)
+    p.add_argument("--json", help="also write the duplicate groups to this JSON file", default=None, type=str)
+    args = p.parse_args()
+
+    started = time.perf_counter()
+    store = FingerprintStore(args.cache or os.path.join(args.scan_dir, CACHE_FILE_NAME))
+    paths = [os.path.join(directory.root, entry.name)
+             for directory in walk_library(args.scan_dir)
+             for entry in directory.files if entry.name.lower().endswith(MP3_EXTENSIONS + MP4_EXTENSIONS)]
+    print(f"Fingerprinting {len(paths)} MP3/MP4 file(s) under [{args.scan_dir}]...")
+
+    pool = ThreadPoolExecutor(max_workers=args.jobs) if args.jobs > 1 else None
+    try:
+        groups = find_duplicates(paths, store, pool)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    store.forget_missing(args.scan_dir, {os.path.abspath(path) for path in paths})
+    store.close()
+
+    wasted = 0
+    for payload_size, files in groups:
+        wasted += payload_size * (len(files) - 1)
+        print(f">> ------- {len(files)} copies, {payload_size:,} bytes of audio/video each -------")
+        for path in files:
+            print(path)
+
+    print(f"Duplicate groups: {len(groups)}, duplicate files: {sum(len(files) - 1 for _, files in groups)}, "
+          f"{wasted:,} bytes held more than once")
+    print(f"Fingerprints: {store.partial_hashed} partial, {store.full_hashed} full ({store.bytes_hashed:,} bytes), "
+          f"{store.reused} reused from the cache, {time.perf_counter() - started:.2f} s")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump([{"payload_size": payload_size, "files": files} for payload_size, files in groups],
+                      f, ensure_ascii=False, indent=2)
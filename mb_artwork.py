@@ -0,0 +1,114 @@
+import hashlib
+import io
+import os
+import threading
+from typing import NamedTuple
+
+try:
+    # optional: resize and re-encode the source images
+    from PIL import Image
+except ImportError:
+    Image = None
+
+# Cover art for the albums and collections of the library.
+#
+# The source images live in one folder and are named after the album (or
+# the start of it) they belong to: mbP1L1.jpg, "Phrase Vault.png", MSLK.jpg,
+# "LI IMMERSION.jpg". An album takes the image with the longest name it
+# starts with, not counting a name followed by a digit (case is ignored):
+# mbP1L1.jpg wins over mbP1.jpg, and mbP1L10 does not take mbP1L1.jpg.
+#
+# Each source image is resized to fit MAX_SIZE and encoded as JPEG once; the
+# result is kept in a cache folder under a name derived from the source's
+# content and the encoding settings, so a later run reads it back instead of
+# encoding again, and an edited source image gets a new entry. Without
+# Pillow, JPEG and PNG sources are embedded as they are.
+
+ART_EXTENSIONS = {'.jpg': "image/jpeg", '.jpeg': "image/jpeg", '.png': "image/png"}
+ART_DIR_NAME = "artwork"
+ART_CACHE_DIR_NAME = ".mb_artwork_cache"
+MAX_SIZE = 600
+QUALITY = 90
+
+
+class Artwork(NamedTuple):
+    data: bytes
+    mime: str
+    digest: str  # sha1 of data, to recognise files that already hold it
+
+
+def digest_of(data):
+    return hashlib.sha1(data).hexdigest()
+
+
+def find_sources(art_dir):
+    """Return {lower-case image name without extension: path} of the images in art_dir."""
+    sources = {}
+    for entry in os.scandir(art_dir):
+        stem, ext = os.path.splitext(entry.name)
+        if entry.is_file() and ext.lower() in ART_EXTENSIONS:
+            sources[stem.lower()] = entry.path
+    return sources
+
+
+def encode(source):
+    """Resize and encode a source image; returns (data, mime)."""
+    with open(source, 'rb') as f:
+        data = f.read()
+    if Image is None:
+        return data, ART_EXTENSIONS[os.path.splitext(source)[1].lower()]
+    with Image.open(io.BytesIO(data)) as image:
+        image.thumbnail((MAX_SIZE, MAX_SIZE))
+        output = io.BytesIO()
+        image.convert("RGB").save(output, "JPEG", quality=QUALITY, optimize=True)
+    return output.getvalue(), "image/jpeg"
+
+
+class ArtworkCache:
+    """Encoded cover art per album, encoded at most once per source image and settings."""
+
+    def __init__(self, art_dir, cache_dir):
+        self.sources = find_sources(art_dir)
+        self.cache_dir = cache_dir
+        self.lock = threading.Lock()
+        self.images = {}  # source path -> Artwork
+        self.encoded = 0
+        self.reused = 0
+
+    def source_for(self, album):
+        album = (album or "").lower()
+        names = [name for name in self.sources
+                 if album.startswith(name) and not album[len(name):len(name) + 1].isdigit()]
+        return self.sources[max(names, key=len)] if names else None
+
+    def for_album(self, album):
+        """Return the Artwork of an album, or None if no source image matches it."""
+        source = self.source_for(album)
+        if source is None:
+            return None
+        with self.lock:  # encode each source once, even with --jobs
+            artwork = self.images.get(source)
+            if artwork is None:
+                artwork = self.images[source] = self._load(source)
+        return artwork
+
+    def _load(self, source):
+        with open(source, 'rb') as f:
+            settings = f"{MAX_SIZE}:{QUALITY}" if Image is not None else "original"
+            key = hashlib.sha1(f.read() + settings.encode()).hexdigest()
+        for mime, ext in (("image/jpeg", ".jpg"), ("image/png", ".png")):
+            path = os.path.join(self.cache_dir, key + ext)
+            if os.path.exists(path):
+                with open(path, 'rb') as f:
+                    data = f.read()
+                self.reused += 1
+                return Artwork(data, mime, digest_of(data))
+
+        data, mime = encode(source)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = os.path.join(self.cache_dir, key + (".png" if mime == "image/png" else ".jpg"))
+        with open(path + ".tmp", 'wb') as f:
+            f.write(data)
+        os.replace(path + ".tmp", path)
+        self.encoded += 1
+        return Artwork(data, mime, digest_of(data))
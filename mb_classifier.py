@@ -0,0 +1,156 @@
+import os
+import re
+from typing import NamedTuple, Optional
+
+# Filename grammars of all Mandarin Blueprint rule sets, compiled once.
+#
+# classify() checks one filename against every rule; classify_listing()
+# classifies a whole directory listing, working out the phase and level of
+# the directory once for all of its files.
+
+
+class FilenameMatch(NamedTuple):
+    """A filename that matched one rule, with the fields its name encodes."""
+    rule: str                         # tpv, mslk, li, sentence, story_audio or story_video
+    name: str
+    title: Optional[str] = None       # raw title / lesson number / level, as in the filename
+    part: Optional[str] = None
+    album_code: Optional[str] = None  # IMMERSION, LLR or TAP
+    person: Optional[str] = None
+    gender: Optional[str] = None
+    speed: Optional[str] = None
+    story: Optional[int] = None       # index of the story whose titles matched
+
+
+# Example: Asking_for_Directions_Part_1_LLR_MANDARIN_BLUEPRINT (Part defaults to 1)
+TPV_PATTERN = re.compile(r"(.+?)(?:_Part_(\d+))?_(IMMERSION|LLR|TAP)_MANDARIN_BLUEPRINT")
+# Example: MSLK_Lesson_05_Part_1_IMMERSION_MANDARIN_BLUEPRINT (Part defaults to 1)
+MSLK_PATTERN = re.compile(r"MSLK.Lesson_(.+?)(?:_Part_(\d+))?_(IMMERSION|LLR|TAP)_MANDARIN_BLUEPRINT")
+# Example: SAI-Intro-Part1-JanVanDerWatt, or without Part (defaults to 1)
+LI_PART_PATTERN = re.compile(r"SAI-(.+?)-Part(\d+)-(.*)")
+LI_PATTERN = re.compile(r"SAI-(.+?)-(.+?)")
+# Example: L24 All Sentences Combined
+SENTENCE_PATTERN = re.compile(r"L(\d{1,3}) All Sentences Combined")
+# Example: ...\mandarin blueprint\mbP5L36\...
+LEVEL_PATTERN = re.compile(r".*mandarin blueprint.(mbP(\d{1,2})L(\d{1,3}))")
+
+
+def base_name(name):
+    return os.path.splitext(name)[0]
+
+
+def match_tpv(name):
+    match = TPV_PATTERN.match(base_name(name))
+    if match:
+        raw_title, part_num, album_code = match.groups()
+        return FilenameMatch("tpv", name, title=raw_title, part=part_num or "1", album_code=album_code)
+    return None
+
+
+def match_mslk(name):
+    match = MSLK_PATTERN.match(base_name(name))
+    if match:
+        lesson_number, part_num, album_code = match.groups()
+        return FilenameMatch("mslk", name, title=lesson_number, part=part_num or "1", album_code=album_code)
+    return None
+
+
+def match_li(name):
+    base = base_name(name)
+    match = LI_PART_PATTERN.match(base)
+    if match:
+        raw_title, part_num, person = match.groups()
+        return FilenameMatch("li", name, title=raw_title, part=part_num, person=person)
+    match = LI_PATTERN.match(base)
+    if match:
+        raw_title, person = match.groups()
+        return FilenameMatch("li", name, title=raw_title, part="1", person=person)
+    return None
+
+
+def match_sentence(name, level):
+    """Match an 'L<level> All Sentences Combined' file of the given level (e.g. "24")."""
+    match = SENTENCE_PATTERN.match(base_name(name))
+    if match and match.group(1) == level:
+        return FilenameMatch("sentence", name, title=match.group(1))
+    return None
+
+
+def find_level(path):
+    """Return (mbPL, phase, level) of a path inside 'mandarin blueprint', e.g. ("mbP5L36", "5", "36")."""
+    match = LEVEL_PATTERN.match(os.path.abspath(path))
+    if match:
+        return match.groups()
+    return None, None, None
+
+
+def find_child_level(parent_name, name):
+    """Return (mbPL, phase, level) that directory name sets below a directory named parent_name, or None.
+
+    The level of a path is set by its last 'mandarin blueprint' folder followed
+    by a level folder, so walking down a tree a directory has this level, or
+    else the level of its parent.
+    """
+    match = LEVEL_PATTERN.match(parent_name + os.sep + name)
+    if match:
+        return match.groups()
+    return None
+
+
+def compile_story_patterns(english_titles):
+    """Compile one audio and one video filename pattern covering all English titles of a story."""
+    titles = "|".join(re.escape(title) for title in sorted(english_titles, key=len, reverse=True))
+    # Example: AUDIO - <title> - [Paragraph #x] - EN<gender> (EN<speed>).mp3
+    audio_pattern = re.compile(rf"AUDIO - (?:{titles}) - (Male|Female) \((Slower|Native Speed)\)")
+    # Example: VIDEO <GENDER> - <title> - [Paragraph #x].mp4
+    video_pattern = re.compile(rf"VIDEO (MALE|FEMALE) - (?:{titles})")
+    return audio_pattern, video_pattern
+
+
+def match_story(name, stories):
+    """Match an AUDIO (.mp3) or VIDEO (.mp4) story file against (audio_pattern, video_pattern) pairs."""
+    base = base_name(name)
+    is_audio = name.lower().endswith(".mp3")
+    matches = []
+    for index, (audio_pattern, video_pattern) in enumerate(stories):
+        if is_audio:
+            match = audio_pattern.match(base)
+            if match:
+                gender, speed = match.groups()
+                matches.append(FilenameMatch("story_audio", name, gender=gender, speed=speed, story=index))
+        else:
+            match = video_pattern.match(base)
+            if match:
+                matches.append(FilenameMatch("story_video", name, gender=match.group(1), story=index))
+    return matches
+
+
+def classify(name, level=None, stories=()):
+    """Return the FilenameMatch of every rule this filename matches.
+
+    level is the level number of the file's directory (for the sentence rule),
+    stories the compiled patterns of the TITLE INFO files next to it.
+    """
+    matches = []
+    lower = name.lower()
+    if lower.endswith(".mp3"):
+        for matcher in (match_tpv, match_mslk, match_li):
+            match = matcher(name)
+            if match:
+                matches.append(match)
+        if level is not None:
+            match = match_sentence(name, level)
+            if match:
+                matches.append(match)
+    if lower.endswith((".mp3", ".mp4")):
+        matches.extend(match_story(name, stories))
+    return matches
+
+
+def classify_listing(dirpath, names, stories=(), level=None):
+    """Classify all names of one directory listing; returns [(name, [FilenameMatch, ...]), ...].
+
+    level is the (mbPL, phase, level) of dirpath, if the caller already knows it.
+    """
+    mbPL, mbP, mbL = level or find_level(dirpath)
+    return [(name, classify(name, mbL, stories)) for name in names]
@@ -0,0 +1,204 @@
+import hashlib
+import os
+import sqlite3
+import struct
+import threading
+
+# Fingerprints of the audio/video payload of media files, without their tags.
+#
+# The payload of an MP3 is what follows its ID3v2 tag, up to an ID3v1 tag at
+# the end; the payload of an MP4 is the content of its mdat atoms (the tags
+# live in moov). Two files with the same payload are the same recording,
+# whatever their names and tags.
+#
+# A partial fingerprint hashes the payload size with its first and last
+# PARTIAL_BLOCK bytes; only files whose partial fingerprints collide get the
+# full payload hashed. Both are kept in the 'payloads' table of the scan
+# cache file, keyed by path, size and mtime, and reused by the next run.
+
+PARTIAL_BLOCK = 64 * 1024
+CHUNK = 1024 * 1024
+MP3_EXTENSIONS = ('.mp3',)
+MP4_EXTENSIONS = ('.mp4', '.m4a', '.m4v')
+
+
+def mp3_payload(f, size):
+    """Byte ranges of the audio of an MP3: after its ID3v2 tag, before an ID3v1 tag."""
+    header = f.read(10)
+    start = 0
+    if len(header) == 10 and header[:3] == b"ID3":
+        start = 10 + ((header[6] << 21) | (header[7] << 14) | (header[8] << 7) | header[9])
+        if header[5] & 0x10:
+            start += 10  # footer
+    end = size
+    if size - start >= 128:
+        f.seek(size - 128)
+        if f.read(3) == b"TAG":
+            end = size - 128
+    return [(start, end)] if end > start else []
+
+
+def mp4_payload(f, size):
+    """Byte ranges of the media data of an MP4: the content of its top-level mdat atoms."""
+    ranges = []
+    offset = 0
+    while offset + 8 <= size:
+        f.seek(offset)
+        atom_size, name = struct.unpack(">I4s", f.read(8))
+        header = 8
+        if atom_size == 1:
+            atom_size = struct.unpack(">Q", f.read(8))[0]
+            header = 16
+        elif atom_size == 0:
+            atom_size = size - offset  # up to the end of the file
+        if atom_size < header:
+            break  # not a valid atom: stop rather than loop
+        if name == b"mdat":
+            ranges.append((offset + header, min(offset + atom_size, size)))
+        offset += atom_size
+    return ranges
+
+
+def payload_ranges(full_path, f, size):
+    if full_path.lower().endswith(MP4_EXTENSIONS):
+        return mp4_payload(f, size)
+    return mp3_payload(f, size)
+
+
+def partial_fingerprint(full_path):
+    """Return (payload size, partial fingerprint) of a media file."""
+    size = os.path.getsize(full_path)
+    with open(full_path, 'rb') as f:
+        ranges = payload_ranges(full_path, f, size)
+        payload_size = sum(end - start for start, end in ranges)
+        digest = hashlib.sha1(struct.pack(">Q", payload_size))
+        if ranges:
+            start, end = ranges[0]
+            f.seek(start)
+            digest.update(f.read(min(PARTIAL_BLOCK, end - start)))
+            start, end = ranges[-1]
+            f.seek(max(start, end - PARTIAL_BLOCK))
+            digest.update(f.read(min(PARTIAL_BLOCK, end - start)))
+    return payload_size, digest.hexdigest()
+
+
+def full_fingerprint(full_path):
+    """Hash of the whole payload of a media file."""
+    size = os.path.getsize(full_path)
+    digest = hashlib.sha1()
+    with open(full_path, 'rb') as f:
+        for start, end in payload_ranges(full_path, f, size):
+            f.seek(start)
+            left = end - start
+            while left > 0:
+                data = f.read(min(CHUNK, left))
+                if not data:
+                    break
+                digest.update(data)
+                left -= len(data)
+    return digest.hexdigest()
+
+
+class FingerprintStore:
+    """The 'payloads' table of the scan cache file: fingerprints per path, valid while size and mtime match."""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("""CREATE TABLE IF NOT EXISTS payloads (
+                               path TEXT PRIMARY KEY,
+                               size INTEGER NOT NULL,
+                               mtime_ns INTEGER NOT NULL,
+                               payload_size INTEGER NOT NULL,
+                               partial TEXT NOT NULL,
+                               full TEXT)""")
+        self.db.execute("CREATE INDEX IF NOT EXISTS payloads_full ON payloads (full)")
+        self.db.commit()
+        self.reused = 0
+        self.partial_hashed = 0
+        self.full_hashed = 0
+        self.bytes_hashed = 0
+
+    def partial(self, full_path, st):
+        """Return (payload size, partial, full or None), reusing the stored values of an unchanged file."""
+        key = os.path.abspath(full_path)
+        with self.lock:
+            row = self.db.execute("SELECT size, mtime_ns, payload_size, partial, full FROM payloads WHERE path = ?",
+                                  (key,)).fetchone()
+        if row and row[0] == st.st_size and row[1] == st.st_mtime_ns:
+            with self.lock:
+                self.reused += 1
+            return row[2], row[3], row[4]
+        payload_size, partial = partial_fingerprint(full_path)
+        with self.lock:
+            self.partial_hashed += 1
+            self.db.execute("INSERT OR REPLACE INTO payloads VALUES (?, ?, ?, ?, ?, NULL)",
+                            (key, st.st_size, st.st_mtime_ns, payload_size, partial))
+        return payload_size, partial, None
+
+    def full(self, full_path, payload_size):
+        full = full_fingerprint(full_path)
+        with self.lock:
+            self.full_hashed += 1
+            self.bytes_hashed += payload_size
+            self.db.execute("UPDATE payloads SET full = ? WHERE path = ?", (full, os.path.abspath(full_path)))
+        return full
+
+    def forget_missing(self, root, seen):
+        """Drop the rows of files under root that the walk did not find (seen: their abspaths)."""
+        prefix = os.path.join(os.path.abspath(root), "")
+        with self.lock:
+            paths = [path for (path,) in self.db.execute("SELECT path FROM payloads")]
+            for path in paths:
+                if path.startswith(prefix) and path not in seen:
+                    self.db.execute("DELETE FROM payloads WHERE path = ?", (path,))
+
+    def close(self):
+        self.db.commit()
+        self.db.close()
+
+
+def find_duplicates(paths, store, pool=None):
+    """Group media files by payload; returns [(payload size, [path, ...]), ...] of groups of 2 or more.
+
+    pool (a ThreadPoolExecutor) fingerprints files in parallel. Files with a
+    unique payload size or partial fingerprint are never read in full.
+    """
+    run = pool.map if pool is not None else map
+
+    def partial(path):
+        return path, store.partial(path, os.stat(path))
+
+    candidates = {}
+    for path, (payload_size, partial_digest, full) in run(partial, paths):
+        if payload_size:
+            candidates.setdefault((payload_size, partial_digest), []).append((path, full))
+
+    colliding = [(payload_size, path, full) for (payload_size, _), files in candidates.items() if len(files) > 1
+                 for path, full in files]
+
+    def confirm(item):
+        payload_size, path, full = item
+        return payload_size, path, full or store.full(path, payload_size)
+
+    groups = {}
+    for payload_size, path, full in run(confirm, colliding):
+        groups.setdefault((payload_size, full), []).append(path)
+    return sorted(((payload_size, sorted(files)) for (payload_size, _), files in groups.items() if len(files) > 1),
+                  key=lambda group: -group[0] * (len(group[1]) - 1))
+
+
+def load_duplicate_paths(cache_path):
+    """Return the abspaths of the files whose payload the last find_mb_duplicates.py run found in another file."""
+    if not os.path.exists(cache_path):
+        return set()
+    db = sqlite3.connect(cache_path)
+    try:
+        rows = db.execute("SELECT path FROM payloads WHERE full IN "
+                          "(SELECT full FROM payloads WHERE full IS NOT NULL GROUP BY full HAVING COUNT(*) > 1)")
+        return {path for (path,) in rows}
+    except sqlite3.OperationalError:
+        return set()  # no payloads table yet
+    finally:
+        db.close()
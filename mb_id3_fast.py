@@ -0,0 +1,171 @@
+import struct
+
+# Byte-level check whether an MP3 file already carries the expected tags.
+#
+# Only the ID3v2 tag region at the start of the file is read: the frame
+# headers are walked one by one and only the text and COMM frames the rules
+# care about are read and decoded; every other frame (e.g. cover art) is
+# skipped with a seek. The checker only ever answers "matches" or "don't
+# know": anything it does not fully understand (ID3v2.2, unsynchronisation,
+# compressed frames, duplicate frames, multiple values, ...) is left to the
+# full mutagen parse.
+
+ID3_HEADER_SIZE = 10
+
+# EasyID3 key -> ID3 text frame
+EASY_FRAMES = {
+    "title": "TIT2",
+    "album": "TALB",
+    "artist": "TPE1",
+    "genre": "TCON",
+    "discnumber": "TPOS",
+    "tracknumber": "TRCK",
+    "discsubtitle": "TSST",
+}
+
+ENCODINGS = {0: "latin-1", 1: "utf-16", 2: "utf-16-be", 3: "utf-8"}
+
+# frame format flags that change how the payload is stored
+FRAME_FLAGS_V23 = 0x00C0  # compression, encryption
+FRAME_FLAGS_V24 = 0x000F  # compression, encryption, unsynchronisation, data length indicator
+
+
+def expected_frames(expected_tags):
+    """Translate expected EasyID3-style tags into {frame_id: text}, or None if a key has no plain text frame.
+
+    An empty expected value means the frame must be absent and maps to None.
+    """
+    frames = {}
+    for key, value in expected_tags.items():
+        frame_id = EASY_FRAMES.get(key)
+        if frame_id is None:
+            return None
+        frames[frame_id] = value or None
+    return frames
+
+
+def _syncsafe(data):
+    return (data[0] << 21) | (data[1] << 14) | (data[2] << 7) | data[3]
+
+
+def _decode(encoding, data):
+    """Decode an ID3 string; None if it holds more than one value or an unknown encoding."""
+    codec = ENCODINGS.get(encoding)
+    if codec is None:
+        return None
+    terminator = b"\x00\x00" if encoding in (1, 2) else b"\x00"
+    if encoding in (1, 2) and len(data) % 2:
+        return None
+    while data.endswith(terminator):
+        data = data[:-len(terminator)]
+    text = data.decode(codec, errors="strict")
+    if "\x00" in text:
+        return None  # several values
+    return text
+
+
+def _split_desc(encoding, data):
+    """Split an encoded 'description\\0text' payload into (description bytes, rest)."""
+    if encoding in (1, 2):
+        for i in range(0, len(data) - 1, 2):
+            if data[i:i + 2] == b"\x00\x00":
+                return data[:i], data[i + 2:]
+        return None
+    i = data.find(b"\x00")
+    if i < 0:
+        return None
+    return data[:i], data[i + 1:]
+
+
+def _comment(payload):
+    """Return (lang, desc, text) of a COMM frame payload, or None."""
+    if len(payload) < 4:
+        return None
+    encoding, lang = payload[0], payload[1:4]
+    split = _split_desc(encoding, payload[4:])
+    if split is None:
+        return None
+    desc = _decode(encoding, split[0])
+    text = _decode(encoding, split[1])
+    if desc is None or text is None:
+        return None
+    return lang.decode("latin-1"), desc, text
+
+
+def read_frames(f, frame_ids):
+    """Read the wanted text frames and all COMM frames from an open MP3 file.
+
+    Returns ({frame_id: text}, [(lang, desc, text), ...]), or None when the tag
+    uses a feature this reader does not handle.
+    """
+    header = f.read(ID3_HEADER_SIZE)
+    if len(header) < ID3_HEADER_SIZE or header[:3] != b"ID3":
+        return {}, []
+    version, flags = header[3], header[5]
+    if version not in (3, 4) or flags & 0xC0:
+        return None  # v2.2, unsynchronisation or extended header
+    end = ID3_HEADER_SIZE + _syncsafe(header[6:10])
+
+    texts = {}
+    comments = []
+    pos = ID3_HEADER_SIZE
+    while pos + 10 <= end:
+        frame_header = f.read(10)
+        frame_id = frame_header[:4]
+        if frame_id[:1] == b"\x00":
+            break  # padding
+        size_bytes = frame_header[4:8]
+        size = _syncsafe(size_bytes) if version == 4 else struct.unpack(">I", size_bytes)[0]
+        frame_flags = struct.unpack(">H", frame_header[8:10])[0]
+        pos += 10 + size
+        if pos > end:
+            return None
+
+        frame_id = frame_id.decode("latin-1")
+        if frame_id not in frame_ids and frame_id != "COMM":
+            f.seek(size, 1)
+            continue
+        if frame_flags & (FRAME_FLAGS_V24 if version == 4 else FRAME_FLAGS_V23):
+            return None
+        payload = f.read(size)
+        if len(payload) < size:
+            return None
+        try:
+            if frame_id == "COMM":
+                comment = _comment(payload)
+                if comment is None:
+                    return None
+                comments.append(comment)
+            else:
+                if frame_id in texts or not payload:
+                    return None
+                text = _decode(payload[0], payload[1:])
+                if text is None:
+                    return None
+                texts[frame_id] = text
+        except UnicodeDecodeError:
+            return None
+    return texts, comments
+
+
+def audio_tags_match(full_path, frames, comment_text=None):
+    """True if the MP3 file certainly holds the expected frames ({frame_id: text}) and comment.
+
+    False means "not certain": the file may differ or may use a tag layout
+    this reader skips, and has to be checked with mutagen.
+    """
+    with open(full_path, 'rb') as f:
+        found = read_frames(f, frames)
+    if found is None:
+        return False
+    texts, comments = found
+
+    for frame_id, value in frames.items():
+        if texts.get(frame_id) != value:
+            return False
+    if comment_text == "":
+        if any(text for _, _, text in comments):
+            return False  # no comment expected
+    elif comment_text is not None and ("eng", "", comment_text) not in comments:
+        return False
+    return True
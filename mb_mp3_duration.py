@@ -0,0 +1,238 @@
+import mmap
+import os
+from typing import NamedTuple
+from mb_fingerprint import FingerprintStore, mp3_payload
+
+try:
+    # optional: find the frame headers of the whole payload with array operations
+    import numpy as np
+except ImportError:
+    np = None
+
+# Exact duration and average bitrate of an MP3 file, from its frame headers.
+#
+# mutagen estimates the length from the first frame, or from a Xing/VBRI
+# header if the encoder wrote one; a VBR file without such a header gets a
+# wrong length. Here the audio payload (see mb_fingerprint.mp3_payload) is
+# memory-mapped and every MPEG frame is counted: the first frame that is
+# followed by another one fixes the MPEG version, layer and sample rate,
+# and from there each frame header gives the position of the next one.
+# Bytes that are not a frame (junk, a truncated last frame) are skipped up
+# to the next sync word. A leading Xing/Info/VBRI frame holds no audio and
+# is not counted.
+#
+# With NumPy, the candidate sync words and their frame lengths are found
+# for the whole payload at once; without it, the same walk reads the
+# headers one by one.
+
+# kbit/s by (MPEG version, layer) and bitrate index; version 3 = MPEG-1, 2 = MPEG-2, 0 = MPEG-2.5
+BITRATES_V1 = {3: [0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448, 0],   # layer I
+               2: [0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384, 0],      # layer II
+               1: [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 0]}       # layer III
+BITRATES_V2 = {3: [0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256, 0],
+               2: [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160, 0],
+               1: [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160, 0]}
+SAMPLE_RATES = {3: [44100, 48000, 32000], 2: [22050, 24000, 16000], 0: [11025, 12000, 8000]}
+INFO_TAGS = (b"Xing", b"Info", b"VBRI")
+
+class Mp3Duration(NamedTuple):
+    frames: int
+    length: float  # seconds
+    bitrate: int  # average bit/s of the counted frames
+    sample_rate: int
+    vbr: bool  # frames of more than one bitrate
+
+def samples_per_frame(version, layer):
+    if layer == 3:
+        return 384
+    return 1152 if version == 3 or layer == 2 else 576
+
+def frame_info(b1, b2):
+    """Return (frame length without padding, kbit/s, sample rate) of a frame header, or None if invalid."""
+    version, layer = (b1 >> 3) & 3, (b1 >> 1) & 3
+    bitrate_index, rate_index = b2 >> 4, (b2 >> 2) & 3
+    if version == 1 or layer == 0 or rate_index == 3:
+        return None
+    kbps = (BITRATES_V1 if version == 3 else BITRATES_V2)[layer][bitrate_index]
+    if not kbps:
+        return None  # free format or a bad index
+    sample_rate = SAMPLE_RATES[version][rate_index]
+    if layer == 3:
+        return 12 * kbps * 1000 // sample_rate * 4, kbps, sample_rate
+    return samples_per_frame(version, layer) // 8 * kbps * 1000 // sample_rate, kbps, sample_rate
+
+def frame_length(b1, b2):
+    """Full length of the frame whose header holds b1, b2 (padding included), or 0 if invalid."""
+    info = frame_info(b1, b2)
+    if info is None:
+        return 0
+    padding = (b2 >> 1) & 1
+    return info[0] + (padding * 4 if (b1 >> 1) & 3 == 3 else padding)
+
+def _length_table():
+    """frame_length() of every (b1, b2) pair, as a 256 x 256 NumPy array."""
+    table = np.zeros((256, 256), dtype=np.int64)
+    for b1 in range(0xE0, 0x100):
+        for b2 in range(256):
+            table[b1, b2] = frame_length(b1, b2)
+    return table
+
+_length_tables = []
+
+
+def is_info_frame(buffer, pos, end):
+    return any(buffer.find(tag, pos + 4, min(pos + 44, end)) >= 0 for tag in INFO_TAGS)
+
+
+def duration_of(b1, b2, frames, audio_bytes, bitrates):
+    """Build the Mp3Duration of frames counted with the header bytes b1, b2 of the first one."""
+    if not frames:
+        return None
+    version, layer = (b1 >> 3) & 3, (b1 >> 1) & 3
+    sample_rate = frame_info(b1, b2)[2]
+    length = frames * samples_per_frame(version, layer) / sample_rate
+    return Mp3Duration(frames, length, round(audio_bytes * 8 / length), sample_rate, len(bitrates) > 1)
+
+
+def _count_frames_numpy(buffer, start, end):
+    if not _length_tables:
+        _length_tables.append(_length_table())
+    size = end - start
+    if size < 4:
+        return None
+    data = np.frombuffer(buffer, dtype=np.uint8, count=size, offset=start)
+    sync = np.flatnonzero((data[:-3] == 0xFF) & (data[1:-2] >= 0xE0))
+    b1, b2 = data[sync + 1], data[sync + 2]
+    del data  # the mmap cannot be closed while an array uses it
+    lengths = _length_tables[0][b1, b2]
+    complete = (lengths > 0) & (sync + lengths <= size)
+    positions, lengths, b1, b2 = sync[complete], lengths[complete], b1[complete], b2[complete]
+    ends = positions + lengths
+
+    # the first frame is one whose successor is a frame too, or that ends the payload
+    chained = np.isin(ends, positions) | (ends == size)
+    if not chained.any():
+        return None
+    first = int(np.argmax(chained))
+    matching = ((b1 & 0xFE) == (b1[first] & 0xFE)) & ((b2 & 0x0C) == (b2[first] & 0x0C))
+    matching[:first] = False
+    positions, lengths, bitrates, ends = positions[matching], lengths[matching], b2[matching] >> 4, ends[matching]
+
+    # a frame is followed by the first matching header at or after its end (past junk, if any)
+    following = np.searchsorted(positions, ends).tolist()
+    i = following[0] if is_info_frame(buffer, start + int(positions[0]), end) else 0
+    counted = []
+    while i < len(following):
+        counted.append(i)
+        i = following[i]
+    return duration_of(int(b1[first]), int(b2[first]), len(counted), int(lengths[counted].sum()),
+                       set(np.unique(bitrates[counted]).tolist()))
+
+
+def _next_frame(buffer, pos, end):
+    """Return (position, length) of the next complete frame at or after pos, or (None, 0)."""
+    while True:
+        pos = buffer.find(b"\xff", pos, end - 3)
+        if pos < 0:
+            return None, 0
+        length = frame_length(buffer[pos + 1], buffer[pos + 2]) if buffer[pos + 1] >= 0xE0 else 0
+        if length and pos + length <= end:
+            return pos, length
+        pos += 1
+
+
+def _count_frames_python(buffer, start, end):
+    pos, length = _next_frame(buffer, start, end)
+    while pos is not None and pos + length != end and _next_frame(buffer, pos + length, end)[0] != pos + length:
+        pos, length = _next_frame(buffer, pos + 1, end)
+    if pos is None:
+        return None
+    b1, b2 = buffer[pos + 1], buffer[pos + 2]
+    header = (b1 & 0xFE, b2 & 0x0C)  # version, layer, sample rate
+    if is_info_frame(buffer, pos, end):
+        pos += length
+
+    frames = audio_bytes = 0
+    bitrates = set()
+    pos, length = _next_frame(buffer, pos, end)
+    while pos is not None:
+        if (buffer[pos + 1] & 0xFE, buffer[pos + 2] & 0x0C) == header:
+            frames += 1
+            audio_bytes += length
+            bitrates.add(buffer[pos + 2] >> 4)
+            pos, length = _next_frame(buffer, pos + length, end)
+        else:
+            pos, length = _next_frame(buffer, pos + 1, end)
+    return duration_of(b1, b2, frames, audio_bytes, bitrates)
+
+
+def count_frames(buffer, start, end):
+    """Count the MPEG frames of buffer[start:end]; returns an Mp3Duration, or None if there are none."""
+    if np is not None:
+        return _count_frames_numpy(buffer, start, end)
+    return _count_frames_python(buffer, start, end)
+
+
+def scan_mp3(full_path):
+    """Memory-map the audio payload of an MP3 file and count its frames; returns an Mp3Duration or None."""
+    size = os.path.getsize(full_path)
+    if size == 0:
+        return None
+    with open(full_path, 'rb') as f:
+        ranges = mp3_payload(f, size)
+        if not ranges:
+            return None
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            start, end = ranges[0]
+            return count_frames(buffer, start, end)
+
+
+class DurationStore(FingerprintStore):
+    """Frame scan results in the 'durations' table of the scan cache file, keyed by the full payload fingerprint.
+
+    A file is scanned once per audio content: retagging it, or a copy of it
+    elsewhere in the library, reuses the stored result. The key is the hash
+    of the whole payload, not the partial fingerprint (which only covers its
+    ends); the full hash of an unchanged file is kept in the payloads table,
+    and hashing a retagged one reads the payload once, faster than a scan.
+    """
+
+    def __init__(self, path):
+        super().__init__(path)
+        columns = [row[1] for row in self.db.execute("PRAGMA table_info(durations)")]
+        if "partial" in columns:
+            self.db.execute("DROP TABLE durations")  # keyed by the partial fingerprint: scan again
+        self.db.execute("""CREATE TABLE IF NOT EXISTS durations (
+                               payload_size INTEGER NOT NULL,
+                               full TEXT NOT NULL,
+                               frames INTEGER NOT NULL,
+                               length REAL NOT NULL,
+                               bitrate INTEGER NOT NULL,
+                               sample_rate INTEGER NOT NULL,
+                               vbr INTEGER NOT NULL,
+                               PRIMARY KEY (payload_size, full))""")
+        self.db.commit()
+        self.scanned = 0
+        self.bytes_scanned = 0
+        self.durations_reused = 0
+
+    def duration(self, full_path, st=None):
+        """Return the Mp3Duration of an MP3 file, or None if it holds no MPEG frames."""
+        payload_size, _, full = self.partial(full_path, st or os.stat(full_path))
+        if full is None:
+            full = self.full(full_path, payload_size)
+        with self.lock:
+            row = self.db.execute("SELECT frames, length, bitrate, sample_rate, vbr FROM durations "
+                                  "WHERE payload_size = ? AND full = ?", (payload_size, full)).fetchone()
+        if row:
+            with self.lock:
+                self.durations_reused += 1
+            return Mp3Duration(row[0], row[1], row[2], row[3], bool(row[4]))
+        duration = scan_mp3(full_path)
+        with self.lock:
+            self.scanned += 1
+            self.bytes_scanned += payload_size
+            if duration is not None:
+                self.db.execute("INSERT OR REPLACE INTO durations VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                (payload_size, full) + tuple(duration))
+        return duration
@@ -0,0 +1,124 @@
+import cProfile
+import io
+import os
+import pstats
+import threading
+import time
+
+# Profiling hooks shared by the update scripts and display_file_tags.py.
+#
+# --profile FILE profiles the whole run with cProfile, dumps the stats to
+# FILE (for pstats, snakeviz, ...) and prints the --profile-top hottest
+# functions by own time.
+#
+# --sample N profiles one in every N per-file calls (set_audio_tags,
+# set_video_tags, ...) on its own and splits the time of that call into
+# categories, so mutagen parsing can be told apart from regex work, stat
+# calls, file reads and console writes.
+
+CATEGORIES = ["mutagen", "regex", "stat", "file I/O", "console", "other"]
+
+profile_path = None
+profile_top = 25
+sample_every = 0
+
+_profiler = None
+_lock = threading.Lock()
+_sampling = threading.Lock()  # one sampled call at a time: Python allows one active profiler
+_calls = 0
+_samples = []  # (seconds, {category: seconds}) per sampled call
+
+
+def add_arguments(p):
+    p.add_argument("--profile", help="profile the run with cProfile and dump the stats to this file "
+                                     "(with --jobs, only the main thread is profiled)", default=None, type=str)
+    p.add_argument("--profile-top", help="number of hot functions to print with --profile", default=25, type=int)
+    p.add_argument("--sample", help="time one in every N per-file calls, split into mutagen/regex/stat/file I/O/console",
+                   default=0, type=int)
+
+
+def start(args):
+    """Apply the profiling options and start the whole-run profile, if asked for."""
+    global profile_path, profile_top, sample_every, _profiler
+    profile_path = getattr(args, "profile", None)
+    profile_top = getattr(args, "profile_top", 25)
+    sample_every = max(0, getattr(args, "sample", 0) or 0)
+    if profile_path:
+        _profiler = cProfile.Profile()
+        _profiler.enable()
+
+
+def category(filename, funcname):
+    """Category of a profiled function, by where it is defined (cProfile's key of a function)."""
+    path = filename.replace("\\", "/")
+    if "/mutagen/" in path or path.endswith("codecs>") or "/encodings/" in path:
+        return "mutagen"  # including the text decoding of tag frames
+    if (path.endswith(("/re.py", "/sre_compile.py", "/sre_parse.py")) or "/re/" in path
+            or "re.Pattern" in funcname or "_sre" in funcname):
+        return "regex"
+    if ("stat" in funcname and ("posix" in funcname or "nt." in funcname)) or "scandir" in funcname \
+            or "DirEntry" in funcname or path.endswith("/genericpath.py"):
+        return "stat"
+    if "TextIOWrapper" in funcname or "builtins.print" in funcname or "StringIO" in funcname \
+            or (path.endswith("/mb_tag_core.py") and funcname in ("write", "flush")):
+        return "console"
+    if "io.open" in funcname or "Buffered" in funcname or "FileIO" in funcname:
+        return "file I/O"
+    return "other"
+
+
+def _split(profiler):
+    times = dict.fromkeys(CATEGORIES, 0.0)
+    for (filename, lineno, funcname), (cc, nc, tt, ct, callers) in pstats.Stats(profiler).stats.items():
+        times[category(filename, funcname)] += tt
+    return times
+
+
+def call(fn, *args):
+    """Run fn(*args); with --sample N, every Nth call is profiled and its time split into categories."""
+    global _calls
+    if not sample_every:
+        return fn(*args)
+    with _lock:
+        _calls += 1
+        due = _calls % sample_every == 0
+    if not due or _profiler is not None or not _sampling.acquire(blocking=False):
+        return fn(*args)
+    try:
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+        profiler.enable()
+        try:
+            return fn(*args)
+        finally:
+            profiler.disable()
+            elapsed = time.perf_counter() - started
+            with _lock:
+                _samples.append((elapsed, _split(profiler)))
+    finally:
+        _sampling.release()
+
+
+def report():
+    """Stop the whole-run profile, dump it and print the hot functions and the sampled call timings."""
+    global _profiler
+    if _profiler is not None:
+        _profiler.disable()
+        _profiler.dump_stats(profile_path)
+        out = io.StringIO()
+        pstats.Stats(_profiler, stream=out).strip_dirs().sort_stats("tottime").print_stats(profile_top)
+        print(f">> ------- profile written to [{os.path.abspath(profile_path)}], top {profile_top} functions by own time -------")
+        print(out.getvalue().strip())
+        _profiler = None
+
+    if sample_every:
+        if profile_path:
+            print("Per-call sampling is skipped while --profile profiles the whole run")
+        print(f">> ------- sampled {len(_samples)} of {_calls} per-file calls (1 in {sample_every}) -------")
+        if _samples:
+            total = sum(elapsed for elapsed, _ in _samples)
+            print(f"Mean per call: {1000 * total / len(_samples):.3f} ms (profiled, so slower than unsampled calls)")
+            for name in CATEGORIES:
+                seconds = sum(times[name] for _, times in _samples)
+                share = 100 * seconds / total if total else 0.0
+                print(f"  {name:<9}: {1000 * seconds / len(_samples):8.3f} ms per call, {share:5.1f} %")
@@ -0,0 +1,124 @@
+import json
+import os
+import threading
+from collections import Counter
+
+# Streaming per-file run report of update_mb_story_tags.py and
+# update_mb_sentence_tags.py.
+#
+# The status of every file ("<== updated", "<-- no change", "<== UNMATCHED")
+# is kept in memory only until its directory is complete; then the
+# statuses of that directory are appended to a JSONL file, followed by a
+# {"done": <directory>} line, and only the counts per status stay in
+# memory. A run that was interrupted can be restarted with --resume: the
+# directories recorded as done are skipped and their counts carried over.
+
+REPORT_FILE_NAME = ".mb_run_report_{rule}.jsonl"
+UNMATCHED = "<== UNMATCHED"
+
+
+def add_arguments(p):
+    p.add_argument("--report", help="stream the status of every file to this JSONL file "
+                                    "(default: <scan_dir>/" + REPORT_FILE_NAME.format(rule="<rule>") + ")",
+                   default=None, type=str)
+    p.add_argument("--resume", help="skip the directories an interrupted run already completed, from its --report",
+                   action="store_true")
+
+
+class RunReport:
+    """Per-directory buffered statuses, streamed to a JSONL report as each directory completes."""
+
+    def __init__(self, path, resume=False):
+        self.path = path
+        self.lock = threading.Lock()  # statuses are set by the --jobs worker threads
+        self.counts = Counter()
+        self.done = set()  # directories completed in the run being resumed
+        self.open = {}  # directory -> {full_path: status}, until the directory is complete
+        if resume and os.path.exists(path):
+            end = self._load()
+            with open(path, 'r+b') as f:
+                f.truncate(end)  # drop the records of a directory the interrupted run left unfinished
+            self.file = open(path, 'a', encoding='utf-8')
+        else:
+            self.file = open(path, 'w', encoding='utf-8')
+
+    def _load(self):
+        """Read the done directories and the counts of a previous run; returns the offset after its last done line."""
+        end = 0
+        pending = Counter()
+        with open(self.path, 'rb') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break  # a line cut short by the interruption
+                if "done" in record:
+                    self.done.add(record["done"])
+                    self.counts.update(pending)
+                    pending.clear()
+                    end = f.tell()
+                else:
+                    pending[record["status"]] += 1
+        return end
+
+    def is_done(self, directory):
+        return os.path.normpath(directory) in self.done
+
+    def add(self, full_path):
+        """Register a file as seen; it stays UNMATCHED unless set() gives it another status."""
+        with self.lock:
+            self.open.setdefault(os.path.normpath(os.path.dirname(full_path)), {}).setdefault(full_path, UNMATCHED)
+
+    def set(self, full_path, status):
+        with self.lock:
+            self.open.setdefault(os.path.normpath(os.path.dirname(full_path)), {})[full_path] = status
+
+    def directory_done(self, directory):
+        """Write out the statuses of a directory whose files are all processed, and mark it done."""
+        directory = os.path.normpath(directory)
+        with self.lock:
+            statuses = self.open.pop(directory, {})
+        lines = [json.dumps({"path": full_path, "status": status}, ensure_ascii=False)
+                 for full_path, status in statuses.items()]
+        lines.append(json.dumps({"done": directory}, ensure_ascii=False))
+        self.file.write("\n".join(lines) + "\n")
+        self.file.flush()
+        self.counts.update(statuses.values())
+
+    def close(self):
+        # statuses of directories never marked done (e.g. an error stopped the run) are still worth keeping
+        for directory in list(self.open):
+            statuses = self.open.pop(directory)
+            for full_path, status in statuses.items():
+                self.file.write(json.dumps({"path": full_path, "status": status}, ensure_ascii=False) + "\n")
+            self.counts.update(statuses.values())
+        self.file.close()
+
+    def files_with_status(self, status):
+        """Stream the paths of the report file with the given status."""
+        with open(self.path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if record.get("status") == status:
+                    yield record["path"]
+
+
+def open_report(args, rule):
+    """Open the run report of a script from its --report/--resume options."""
+    path = args.report or os.path.join(args.scan_dir, REPORT_FILE_NAME.format(rule=rule))
+    report = RunReport(path, args.resume)
+    if args.resume:
+        print(f"Resuming from [{path}]: {len(report.done)} directories already done")
+    return report
+
+
+def print_report(report):
+    """Print the counts per status and the unmatched files, reading them back from the report file."""
+    print(f">> ------- file report [{report.path}] -------")
+    for status, n in sorted(report.counts.items()):
+        print(f"{status}: {n}")
+    for full_path in report.files_with_status(UNMATCHED):
+        print(f"{full_path}: {UNMATCHED}")
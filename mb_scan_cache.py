@@ -0,0 +1,225 @@
+import hashlib
+import os
+import sqlite3
+import threading
+
+# Persistent scan cache for the update_mb_*_tags.py scripts.
+#
+# One SQLite file at the library root remembers, per file and per rule set,
+# the size, mtime and a hash of the tag header of the file after it was last
+# checked, plus a digest of the tags the rule expected. A re-run only stats
+# a file; it is opened again only when one of those changed.
+#
+# The same file holds the tag index: the tags each checked file carries
+# after the run (by EasyID3 name; MP4 atoms under the same names), so
+# query_mb_tags.py can answer playlist queries without opening any file.
+#
+# It also holds a Merkle-style fingerprint of each level folder a rule set
+# last walked without leaving anything undone: a hash over the names, sizes
+# and mtimes of everything below it, plus the mtimes of its folders and JSON
+# files. While those mtimes are unchanged the next run can skip the level
+# folder without listing it (a file is added, removed or renamed only by
+# changing the mtime of its folder).
+
+CACHE_FILE_NAME = ".mb_tag_cache.sqlite"
+ID3_HEADER_SIZE = 10
+
+# columns of the tag index
+INDEX_FIELDS = ["title", "album", "artist", "genre", "comment", "discnumber", "discsubtitle", "tracknumber"]
+
+
+def id3_tag_bytes(full_path):
+    """Return the ID3v2 tag of a file (header + frames + padding), or None if it has none."""
+    with open(full_path, 'rb') as f:
+        header = f.read(ID3_HEADER_SIZE)
+        if len(header) < ID3_HEADER_SIZE or header[:3] != b"ID3":
+            return None
+        # syncsafe 28-bit size, excluding the 10 byte header
+        size = (header[6] << 21) | (header[7] << 14) | (header[8] << 7) | header[9]
+        return header + f.read(size)
+
+
+def tag_header_hash(full_path):
+    """Hash the ID3v2 tag of a file (header + frames + padding), or None if it has none."""
+    tag = id3_tag_bytes(full_path)
+    return hashlib.sha1(tag).hexdigest() if tag is not None else None
+
+
+def has_id3v1(full_path):
+    with open(full_path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        if f.tell() < 128:
+            return False
+        f.seek(-128, os.SEEK_END)
+        return f.read(3) == b"TAG"
+
+
+def expected_digest(*values):
+    """Digest of the expected tag values, so a changed rule invalidates cached results."""
+    return hashlib.sha1(repr(values).encode('utf-8')).hexdigest()
+
+
+def directory_fingerprint(path):
+    """Return the fingerprint of a directory tree, or None if it cannot be listed; .git folders are left out.
+
+    Each folder hashes the name, size and mtime of its files and the name and
+    hash of its subfolders; the fingerprint is the hash of path. It takes one
+    listing per folder and a stat per file, and opens no file.
+    """
+
+    def visit(directory):
+        digest = hashlib.sha1()
+        with os.scandir(directory) as entries:
+            entries = sorted(entries, key=lambda entry: entry.name)
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                if entry.name != ".git":
+                    digest.update(f"D {entry.name}\0{visit(entry.path)}\n".encode('utf-8'))
+                continue
+            st = entry.stat(follow_symlinks=False)
+            digest.update(f"F {entry.name}\0{st.st_size}\0{st.st_mtime_ns}\n".encode('utf-8'))
+        return digest.hexdigest()
+
+    try:
+        return visit(path)
+    except OSError:
+        return None
+
+
+class ScanCache:
+    """SQLite-backed record of the last expected-tag result per (path, rule)."""
+
+    def __init__(self, path, rule, invalidate=False):
+        self.path = path
+        self.rule = rule
+        self.hits = 0
+        self.misses = 0
+        self.pending = 0
+        self.lock = threading.Lock()  # shared by the --jobs worker threads
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("""CREATE TABLE IF NOT EXISTS files (
+                               path TEXT NOT NULL,
+                               rule TEXT NOT NULL,
+                               size INTEGER NOT NULL,
+                               mtime_ns INTEGER NOT NULL,
+                               header_hash TEXT,
+                               expected TEXT NOT NULL,
+                               status TEXT NOT NULL,
+                               PRIMARY KEY (path, rule))""")
+        # album is compared without case so that album LIKE 'mbP5L3%' can use its index
+        self.db.execute(f"""CREATE TABLE IF NOT EXISTS tags (
+                               path TEXT PRIMARY KEY,
+                               kind TEXT NOT NULL,
+                               {', '.join(f + (' TEXT COLLATE NOCASE' if f == 'album' else ' TEXT') for f in INDEX_FIELDS)})""")
+        self.db.execute("CREATE INDEX IF NOT EXISTS tags_album ON tags (album)")
+        columns = [row[1] for row in self.db.execute("PRAGMA table_info(dirs)")]
+        if "stamps" in columns:
+            self.db.execute("DROP TABLE dirs")  # records of the mtime-only check: the levels are walked again
+        self.db.execute("""CREATE TABLE IF NOT EXISTS dirs (
+                               path TEXT NOT NULL,
+                               rule TEXT NOT NULL,
+                               fingerprint TEXT NOT NULL,
+                               code TEXT NOT NULL,
+                               PRIMARY KEY (path, rule))""")
+        if invalidate:
+            self.db.execute("DELETE FROM files WHERE rule = ?", (rule,))
+            self.db.execute("DELETE FROM dirs WHERE rule = ?", (rule,))
+        self.db.commit()
+
+    def lookup(self, full_path, expected, st=None):
+        """Return the cached status if the file is unchanged since it was last checked, else None.
+
+        st is the os.stat() result of the file, if the caller already has one
+        (e.g. from the os.DirEntry of a directory walk).
+        """
+        key = os.path.abspath(full_path)
+        with self.lock:
+            row = self.db.execute("SELECT size, mtime_ns, header_hash, status FROM files "
+                                  "WHERE path = ? AND rule = ? AND expected = ?",
+                                  (key, self.rule, expected)).fetchone()
+        status = row and self._unchanged(full_path, key, st, *row)
+        with self.lock:
+            if status:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return status or None
+
+    def _unchanged(self, full_path, key, st, size, mtime_ns, header_hash, status):
+        st = st or os.stat(full_path)
+        if st.st_size == size and st.st_mtime_ns == mtime_ns:
+            return status
+
+        # touched (e.g. by a sync client) but possibly not changed: compare the tag header
+        if st.st_size == size and header_hash is not None and tag_header_hash(full_path) == header_hash:
+            with self.lock:
+                self.db.execute("UPDATE files SET mtime_ns = ? WHERE path = ? AND rule = ?",
+                                (st.st_mtime_ns, key, self.rule))
+                self._commit_later()
+            return status
+
+        return None
+
+    def store(self, full_path, expected, status, header_hash=None):
+        """Record the state of a file right after it was checked or written."""
+        st = os.stat(full_path)
+        with self.lock:
+            self.db.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?)",
+                            (os.path.abspath(full_path), self.rule, st.st_size, st.st_mtime_ns,
+                             header_hash, expected, status))
+            self._commit_later()
+
+    def index_tags(self, full_path, kind, tags, replace=True):
+        """Record the tags a file carries; fields not in tags keep their indexed value.
+
+        With replace=False a file already in the index is left as it is (for
+        unchanged files, so that a warm run does not rewrite the index).
+        """
+        columns = [field for field in INDEX_FIELDS if field in tags]
+        update = (f"UPDATE SET kind = excluded.kind{''.join(f', {c} = excluded.{c}' for c in columns)}"
+                  if replace else "NOTHING")
+        sql = (f"INSERT INTO tags (path, kind{''.join(', ' + c for c in columns)}) "
+               f"VALUES (?, ?{', ?' * len(columns)}) ON CONFLICT (path) DO {update}")
+        with self.lock:
+            self.db.execute(sql, [os.path.abspath(full_path), kind] + [tags[c] or None for c in columns])
+            self._commit_later()
+
+    def directory_state(self, path):
+        """Return (fingerprint, code) recorded for a directory tree, or None."""
+        with self.lock:
+            row = self.db.execute("SELECT fingerprint, code FROM dirs WHERE path = ? AND rule = ?",
+                                  (os.path.abspath(path), self.rule)).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def store_directory(self, path, fingerprint, code):
+        """Record a directory tree the rule set has fully processed (code: digest of the rule code)."""
+        with self.lock:
+            self.db.execute("INSERT OR REPLACE INTO dirs VALUES (?, ?, ?, ?)",
+                            (os.path.abspath(path), self.rule, fingerprint, code))
+            self._commit_later()
+
+    def forget_directory(self, path):
+        with self.lock:
+            self.db.execute("DELETE FROM dirs WHERE path = ? AND rule = ?", (os.path.abspath(path), self.rule))
+            self._commit_later()
+
+    def indexed_albums(self):
+        """Return {abspath: album} of the files in the tag index."""
+        with self.lock:
+            return dict(self.db.execute("SELECT path, album FROM tags"))
+
+    def _commit_later(self):
+        self.pending += 1
+        if self.pending >= 500:
+            self.db.commit()
+            self.pending = 0
+
+    def commit(self):
+        with self.lock:
+            self.db.commit()
+            self.pending = 0
+
+    def close(self):
+        with self.lock:
+            self.db.commit()
+        self.db.close()
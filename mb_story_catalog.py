@@ -0,0 +1,216 @@
+import argparse
+import json
+import os
+import re
+from mb_classifier import find_level
+from mb_tag_core import walk_library, skipped_levels
+
+# Catalog of all story TITLE INFO*.json files of the library.
+#
+# One index file at the library root holds, per JSON file, its size and
+# mtime, the phase/level and paragraph taken from its path and name, and
+# its validated content (or the validation error). A run reads the index
+# once and only re-reads the JSON files whose size or mtime changed, so the
+# metadata of thousands of paragraphs, and the errors of the whole library,
+# are available in one read.
+
+CATALOG_FILE_NAME = ".mb_story_catalog.json"
+CATALOG_VERSION = 1
+
+# Example: TITLE INFO - Sleeping Beauty - Paragraph 1
+TITLE_INFO_PARAGRAPH_PATTERN = re.compile(r"TITLE INFO - (.*) - Paragraph (\d+)")
+TITLE_INFO_PATTERN = re.compile(r"TITLE INFO - (.*)")
+
+
+def is_title_info(name):
+    return name.startswith("TITLE INFO") and name.lower().endswith(".json")
+
+
+def load_and_validate(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+
+    # Check top-level keys
+    if not all(k in data for k in ("title", "text")):
+        raise ValueError("Missing 'title' or 'text' keys")
+
+    for section in ("title", "text"):
+        item = data[section]
+
+        # Each section must be a dict with 'Chinese' and 'English'
+        if not isinstance(item, dict):
+            raise ValueError(f"{section} must be a dict")
+        if "Chinese" not in item or "English" not in item:
+            raise ValueError(f"{section} missing keys")
+
+        if not isinstance(item["Chinese"], str):
+            raise ValueError(f"{section}.Chinese must be a string")
+
+        # Normalize English to list of strings
+        eng = item["English"]
+        if isinstance(eng, str):
+            item["English"] = [eng]
+        elif isinstance(eng, list):
+            if not all(isinstance(s, str) for s in eng):
+                raise ValueError(f"{section}.English must be a string or list of strings")
+        else:
+            raise ValueError(f"{section}.English must be string or list of strings")
+
+    return data
+
+
+def parse_title_info_name(file):
+    """Return (raw_title, paragraph) of a TITLE INFO file name; paragraph is "0" without one, None if no match."""
+    base = os.path.splitext(file)[0]
+    match = TITLE_INFO_PARAGRAPH_PATTERN.match(base)
+    if match:
+        return match.groups()
+    match = TITLE_INFO_PATTERN.match(base)
+    if match:
+        return match.group(1), "0"
+    return None, None
+
+
+def read_entry(full_path, st):
+    """Build the catalog entry of one TITLE INFO file."""
+    mbPL, mbP, mbL = find_level(full_path)
+    raw_title, paragraph = parse_title_info_name(os.path.basename(full_path))
+    entry = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "mbPL": mbPL, "phase": mbP, "level": mbL,
+             "title": raw_title, "paragraph": paragraph, "content": None, "error": None}
+    try:
+        entry["content"] = load_and_validate(full_path)
+    except json.JSONDecodeError as e:
+        entry["error"] = f"error decoding JSON: {e}"
+    except (ValueError, OSError) as e:
+        entry["error"] = str(e)
+    return entry
+
+
+class StoryCatalog:
+    """The catalog of one library, keyed by the path of each TITLE INFO file relative to the library root."""
+
+    def __init__(self, root, path=None, rebuild=False):
+        self.root = root
+        self.path = path or os.path.join(root, CATALOG_FILE_NAME)
+        self.entries = {}
+        self.seen = set()  # keys looked up in this run
+        self.listings = {}  # directory (as in by_directory) -> os.DirEntry of its files, as refresh() listed them
+        self.skipped = ()  # directories (as in by_directory, with a trailing separator) of the levels refresh() skipped
+        self.reads = 0
+        self.dirty = rebuild
+        if not rebuild and os.path.exists(self.path):
+            try:
+                with open(self.path, encoding='utf-8') as f:
+                    index = json.load(f)
+                if index.get("version") == CATALOG_VERSION:
+                    self.entries = index["entries"]
+            except (OSError, ValueError):
+                self.dirty = True  # unreadable index: rebuilt from the JSON files
+
+    def key(self, full_path):
+        return os.path.relpath(full_path, self.root)
+
+    def full_path(self, key):
+        return os.path.join(self.root, key)
+
+    def entry(self, full_path, st=None):
+        """Return the entry of a TITLE INFO file, re-reading the file only if its size or mtime changed."""
+        key = self.key(full_path)
+        self.seen.add(key)
+        st = st or os.stat(full_path)
+        entry = self.entries.get(key)
+        if entry is None or entry["size"] != st.st_size or entry["mtime_ns"] != st.st_mtime_ns:
+            entry = read_entry(full_path, st)
+            self.entries[key] = entry
+            self.reads += 1
+            self.dirty = True
+        return entry
+
+    def refresh(self, filter=None, skip_unchanged=False):
+        """Bring the catalog up to date with the TITLE INFO files under the root; returns {key: entry}.
+
+        With a filter regex, only the directories matching it are visited (see
+        walk_library); the entries of the others are kept as they are. The
+        files of each directory holding a TITLE INFO file are kept in
+        listings, so that the media next to them can be tagged without
+        listing the directory again.
+
+        With skip_unchanged, the level folders unchanged since they were last
+        tagged are not walked (see walk_library); their entries are kept and
+        listed in skipped. The walked levels are recorded by
+        record_walked_levels(), once their media files are tagged.
+        """
+        for directory in walk_library(self.root, filter, skip_unchanged=skip_unchanged, record_levels=False):
+            if not directory.matches:
+                continue
+            for file in directory.files:
+                if is_title_info(file.name):
+                    full_path = os.path.join(directory.root, file.name)
+                    self.entry(full_path, file.stat())
+                    self.listings[os.path.dirname(self.key(full_path))] = directory.files
+        if skip_unchanged:
+            self.skipped = tuple(os.path.join(self.key(folder), "") for folder in skipped_levels)
+            self.forget_unseen(filter, keep=skipped_levels)
+        else:
+            self.forget_unseen(filter)
+        return self.entries
+
+    def forget_unseen(self, filter=None, keep=()):
+        """Drop the entries not looked up in this run; call after visiting the whole library.
+
+        With a filter regex, only the entries of directories matching it are
+        dropped; the entries below the folders of keep (not walked) are kept.
+        """
+        kept = tuple(os.path.join(self.key(folder), "") for folder in keep)
+        for key in set(self.entries) - self.seen:
+            if filter and not re.search(filter, os.path.dirname(self.full_path(key)), re.IGNORECASE):
+                continue
+            if key.startswith(kept):
+                continue
+            del self.entries[key]
+            self.dirty = True
+
+    def by_directory(self):
+        """Return {directory: [(file, entry), ...]} of all entries, sorted, directories relative to the root."""
+        directories = {}
+        for key in sorted(self.entries):
+            directory, file = os.path.split(key)
+            directories.setdefault(directory, []).append((file, self.entries[key]))
+        return directories
+
+    def errors(self):
+        return [(key, entry["error"]) for key, entry in sorted(self.entries.items()) if entry["error"]]
+
+    def save(self):
+        """Write the index if it changed (to a temporary file first, so a crash never leaves half an index)."""
+        if not self.dirty:
+            return
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"version": CATALOG_VERSION, "entries": self.entries}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+        self.dirty = False
+
+
+def print_errors(catalog):
+    errors = catalog.errors()
+    print(f">> ------- TITLE INFO files with errors: {len(errors)} -------")
+    for key, error in errors:
+        print(f"#### ---- [{catalog.full_path(key)}]: {error}")
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser()
+    p.add_argument("scan_dir", help="library folder to catalog the TITLE INFO files of", nargs="?", default='.', type=str)
+    p.add_argument("--catalog", help=f"catalog file (default: <scan_dir>/{CATALOG_FILE_NAME})", default=None, type=str)
+    p.add_argument("--rebuild", help="re-read every TITLE INFO file", action="store_true")
+    args = p.parse_args()
+
+    catalog = StoryCatalog(args.scan_dir, args.catalog, args.rebuild)
+    entries = catalog.refresh()
+    catalog.save()
+
+    levels = {entry["mbPL"] for entry in entries.values() if entry["mbPL"]}
+    print(f"Catalog [{catalog.path}]: {len(entries)} TITLE INFO file(s) in {len(levels)} level(s), "
+          f"{catalog.reads} (re)read")
+    print_errors(catalog)
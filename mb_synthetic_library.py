@@ -0,0 +1,119 @@
+import os
+import json
+import struct
+import argparse
+
+# Builds a synthetic Mandarin Blueprint library for benchmarks: untagged but
+# valid MP3 and MP4 files, named and laid out like the real downloads.
+#
+#   Phrase Vault/<Subject>_Part_<n>_<ALBUM>_MANDARIN_BLUEPRINT.mp3
+#   MSLK/MSLK_Lesson_<nn>_<ALBUM>_MANDARIN_BLUEPRINT.mp3
+#   Language Islands/SAI-<Subject>-Part<n>-<Person>.mp3
+#   mandarin blueprint/mbP<p>L<l>/L<l> All Sentences Combined.mp3
+#   mandarin blueprint/mbP<p>L<l>/mbP<p>L<l><Story>P<k>/TITLE INFO - <Story> - Paragraph <k>.json
+#       AUDIO - <Story> - Paragraph <k> - <Male|Female> (<Slower|Native Speed>).mp3
+#       VIDEO <MALE|FEMALE> - <Story> - Paragraph <k>.mp4
+
+# one MPEG-1 Layer III frame (128 kbit/s, 44.1 kHz) of silence
+MP3_FRAME = b"\xff\xfb\x90\x64" + b"\x00" * 413
+
+SUBJECTS = ["Asking_for_Directions", "Leisure_Hobbies", "Ordering_Food", "Small_Talk", "Weather",
+            "Shopping", "Family", "Travel", "Health", "Work"]
+ALBUMS = ["IMMERSION", "LLR", "TAP"]
+PEOPLE = ["JanVanDerWatt", "LukeNeale", "PhilCrimmins"]
+STORIES = [("Honesty", "诚实"), ("Sleeping Beauty", "睡美人"), ("The Lost Key", "丢钥匙"),
+           ("A Rainy Day", "下雨天"), ("The Market", "市场")]
+
+# files per unit of --scale
+PHRASES_PER_SCALE = 50
+LESSONS_PER_SCALE = 20
+ISLANDS_PER_SCALE = 20
+LEVELS_PER_SCALE = 10
+PARAGRAPHS_PER_LEVEL = 2
+
+
+def write_mp3(path, frames):
+    with open(path, 'wb') as f:
+        f.write(MP3_FRAME * frames)
+
+
+def _atom(name, payload):
+    return struct.pack(">I4s", 8 + len(payload), name) + payload
+
+
+def write_mp4(path, payload_size):
+    """A minimal MP4 that mutagen can read and tag: ftyp, moov (mvhd + one track) and mdat."""
+    ftyp = _atom(b"ftyp", b"M4V \x00\x00\x00\x00M4V mp42isom")
+    mvhd = _atom(b"mvhd", b"\x00" * 12 + struct.pack(">II", 1000, 1000) + b"\x00" * 80)
+    mdhd = _atom(b"mdhd", b"\x00" * 12 + struct.pack(">II", 1000, 1000) + b"\x00" * 4)
+    hdlr = _atom(b"hdlr", b"\x00" * 8 + b"vide" + b"\x00" * 13)
+    moov = _atom(b"moov", mvhd + _atom(b"trak", _atom(b"mdia", mdhd + hdlr)))
+    with open(path, 'wb') as f:
+        f.write(ftyp + moov + _atom(b"mdat", b"\x00" * payload_size))
+
+
+def _makedirs(path):
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def generate(root, scale=1, frames=40, video_size=4096):
+    """Write the synthetic library under root; returns the number of files per rule set."""
+    counts = {"tpv": 0, "mslk": 0, "li": 0, "sentence": 0, "story": 0}
+
+    folder = _makedirs(os.path.join(root, "Phrase Vault"))
+    for i in range(PHRASES_PER_SCALE * scale):
+        subject = f"{SUBJECTS[i % len(SUBJECTS)]}_{i // len(SUBJECTS) + 1}"
+        album = ALBUMS[i % len(ALBUMS)]
+        name = f"{subject}_Part_{i % 3 + 1}_{album}_MANDARIN_BLUEPRINT.mp3"
+        write_mp3(os.path.join(folder, name), frames)
+        counts["tpv"] += 1
+
+    folder = _makedirs(os.path.join(root, "MSLK"))
+    for i in range(LESSONS_PER_SCALE * scale):
+        album = ALBUMS[i % len(ALBUMS)]
+        write_mp3(os.path.join(folder, f"MSLK_Lesson_{i // len(ALBUMS) + 1:02d}_{album}_MANDARIN_BLUEPRINT.mp3"), frames)
+        counts["mslk"] += 1
+
+    folder = _makedirs(os.path.join(root, "Language Islands"))
+    for i in range(ISLANDS_PER_SCALE * scale):
+        subject = SUBJECTS[i % len(SUBJECTS)].replace("_", "") + str(i // len(SUBJECTS) + 1)
+        write_mp3(os.path.join(folder, f"SAI-{subject}-Part{i % 4 + 1}-{PEOPLE[i % len(PEOPLE)]}.mp3"), frames)
+        counts["li"] += 1
+
+    for n in range(LEVELS_PER_SCALE * scale):
+        phase, level = n // 10 + 1, n + 1
+        mbPL = f"mbP{phase}L{level}"
+        level_dir = _makedirs(os.path.join(root, "mandarin blueprint", mbPL))
+        write_mp3(os.path.join(level_dir, f"L{level} All Sentences Combined.mp3"), frames)
+        counts["sentence"] += 1
+
+        english, chinese = STORIES[n % len(STORIES)]
+        for k in range(1, PARAGRAPHS_PER_LEVEL + 1):
+            story_dir = _makedirs(os.path.join(level_dir, f"{mbPL}{english.replace(' ', '')}P{k}"))
+            title_info = {
+                "title": {"Chinese": f"{chinese} - Paragraph #{k}",
+                          "English": [f"{english} - Paragraph #{k}", f"{english} - Paragraph {k}"]},
+                "text": {"Chinese": chinese, "English": english},
+            }
+            with open(os.path.join(story_dir, f"TITLE INFO - {english} - Paragraph {k}.json"), 'w', encoding='utf-8') as f:
+                json.dump(title_info, f, ensure_ascii=False)
+            for gender in ("Male", "Female"):
+                for speed in ("Slower", "Native Speed"):
+                    write_mp3(os.path.join(story_dir, f"AUDIO - {english} - Paragraph {k} - {gender} ({speed}).mp3"), frames)
+                    counts["story"] += 1
+                write_mp4(os.path.join(story_dir, f"VIDEO {gender.upper()} - {english} - Paragraph {k}.mp4"), video_size)
+                counts["story"] += 1
+    return counts
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser()
+    p.add_argument("out_dir", help="folder to create the synthetic library in", type=str)
+    p.add_argument("--scale", help=f"size of the library; 1 is about {PHRASES_PER_SCALE + LESSONS_PER_SCALE + ISLANDS_PER_SCALE + LEVELS_PER_SCALE * (1 + 6 * PARAGRAPHS_PER_LEVEL)} media files", default=1, type=int)
+    p.add_argument("--frames", help="MP3 frames of audio per file (417 bytes each)", default=40, type=int)
+    args = p.parse_args()
+
+    counts = generate(args.out_dir, args.scale, args.frames)
+    print(f"Created {sum(counts.values())} media files in [{args.out_dir}]: "
+          + ", ".join(f"{rule} {n}" for rule, n in counts.items()))
@@ -0,0 +1,54 @@
+import os
+import sys
+import json
+import socket
+import argparse
+
+# Thin client of mb_tag_daemon.py. Imports nothing but the standard library,
+# so a request costs the interpreter start and one local round trip:
+#
+#   python mb_tag_client.py tag [path]     tag a file or folder (default: .)
+#   python mb_tag_client.py health
+#   python mb_tag_client.py stats
+#   python mb_tag_client.py shutdown
+
+DEFAULT_PORT = 48765  # as in mb_tag_daemon.py
+
+
+def send(request, port=DEFAULT_PORT, timeout=None):
+    """Send one request to the daemon and return its response."""
+    with socket.create_connection(("127.0.0.1", port), timeout=timeout) as sock:
+        sock.sendall((json.dumps(request, ensure_ascii=False) + "\n").encode('utf-8'))
+        with sock.makefile('rb') as f:
+            return json.loads(f.readline())
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser()
+    p.add_argument("cmd", help="request to send", choices=["tag", "health", "stats", "shutdown"])
+    p.add_argument("path", help="file or folder to tag (tag only)", nargs="?", default='.', type=str)
+    p.add_argument("--port", help="TCP port of the daemon on 127.0.0.1", default=DEFAULT_PORT, type=int)
+    p.add_argument("--json", help="print the raw JSON response", action="store_true")
+    args = p.parse_args()
+
+    request = {"cmd": args.cmd}
+    if args.cmd == "tag":
+        request["path"] = os.path.abspath(args.path)
+    try:
+        response = send(request, args.port, timeout=None if args.cmd == "tag" else 10)
+    except OSError as e:
+        print(f"#### ---- No tag daemon on 127.0.0.1:{args.port} ({e}); start it with mb_tag_daemon.py")
+        sys.exit(2)
+
+    if args.json or args.cmd != "tag":
+        print(json.dumps(response, ensure_ascii=False, indent=2))
+    elif response["ok"]:
+        sys.stdout.write(response["output"])
+        counters = response["counters"]
+        print(f"Files: {counters.get('files', 0)}, updated: {counters.get('updated', 0)}, "
+              f"unchanged: {counters.get('unchanged', 0)}, unmatched: {response['unmatched']}, "
+              f"{1000 * response['elapsed']:.1f} ms in the daemon")
+    if not response["ok"]:
+        if not args.json:
+            print(f"#### ---- {response['error']}")
+        sys.exit(1)
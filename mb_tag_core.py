@@ -0,0 +1,998 @@
+import hashlib
+import io
+import json
+import os
+import re
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import NamedTuple
+from mutagen.easyid3 import EasyID3
+from mutagen.id3 import ID3, APIC, COMM, ID3NoHeaderError
+from mutagen.mp4 import MP4, MP4Cover, Atoms
+from mb_scan_cache import (ScanCache, CACHE_FILE_NAME, tag_header_hash, id3_tag_bytes, has_id3v1, expected_digest,
+                           directory_fingerprint)
+from mb_fingerprint import load_duplicate_paths
+from mb_artwork import digest_of
+from mb_id3_fast import expected_frames, audio_tags_match
+from mb_classifier import find_level, find_child_level
+import mb_profile
+
+# Shared tagging core used by the update_mb_*_tags.py scripts.
+#
+# The ID3 header of each file is parsed once; every expected EasyID3-style
+# field and the COMM frame are compared against that single in-memory tag,
+# and the file is written at most once.
+
+# Library-wide ID3 policy: every script saves ID3v2.3 so files never bounce
+# between versions. A save that fits in the existing tag (frames + padding)
+# is patched in place; only a tag that outgrows it is rewritten, and then
+# PADDING_BUDGET bytes are reserved so later edits fit in place again.
+# MP4 files keep mutagen's own padding, which already writes a change that
+# fits over the old iTunes tags (moov.udta.meta.ilst) and the 'free' atom
+# next to them, and reserves 1 KiB + 0.1% of the video on a rewrite;
+# save_mp4 only reports which of the two a save did.
+ID3_VERSION = 3
+PADDING_BUDGET = 4096
+
+stats = {"walked": 0, "classified": 0, "skipped": 0,
+         "files": 0, "parses": 0, "writes": 0, "updated": 0, "unchanged": 0,
+         "in_place": 0, "rewritten": 0, "bytes_written": 0, "planned": 0, "stale": 0, "fast": 0, "reused": 0,
+         "levels_skipped": 0, "video_writes": 0, "video_rewritten": 0, "video_bytes_written": 0}
+
+# Wall time per phase in seconds; with --jobs the times of all workers are summed.
+phase_times = {"walk": 0.0, "cache": 0.0, "parse": 0.0, "compare": 0.0, "write": 0.0}
+
+cache = None  # ScanCache, set up by configure()
+plan_file = None  # --plan: pending changes are written here instead of to the files
+fast_path = True  # check unchanged MP3s with mb_id3_fast before a full mutagen parse
+metrics_path = None  # --metrics: the run summary is also written here as JSON
+rule_name = None
+
+# Files whose audio another file of the library repeats, as the last
+# find_mb_duplicates.py run found them (abspaths). The result computed for
+# one of them is remembered, and a copy with the same ID3 tag and the same
+# expected tags reuses it: no parse and no diff, and the new tag bytes are
+# written as they are.
+duplicates = set()
+_twins = {}  # (ID3 tag hash, expected digest) -> (changes, tag bytes after the save, or None)
+
+# Level folders walked with skip_unchanged (see walk_library): one the rule
+# set fully processed is recorded in the scan cache with its fingerprint
+# over the names, sizes and mtimes of all its files, and skipped by the next
+# run while the fingerprint is unchanged.
+skipped_levels = []  # level folders skipped in this run
+walked_levels = []  # (level folder, complete) walked with record_levels=False, for record_walked_levels()
+_level_planned = {}  # level folder -> stats["planned"] when its walk started
+_code_digest = None
+
+# --quiet: the per-file and per-directory lines are dropped (only error lines,
+# which start with ####, are kept) and a progress line on stderr shows the
+# counters instead.
+quiet = False
+_console = sys.stdout  # where output finally goes: stdout, or the --quiet filter
+_progress_at = 0.0
+_progress_width = 0
+
+# --jobs N: per-file work runs on a thread pool (the work mostly waits on
+# disk/network I/O). Everything printed, by the workers and by the walking
+# main thread alike, is queued and written out in submission order, so the
+# console output stays grouped per file and identical to a --jobs 1 run.
+jobs = 1
+_pool = None
+_pending = deque()  # futures, main-thread text and after_jobs() calls, in submission order
+_local = threading.local()
+_lock = threading.Lock()
+_started = time.perf_counter()
+
+
+class _QuietOutput:
+    """sys.stdout replacement for --quiet that only lets error lines through."""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.line = ""
+
+    def write(self, text):
+        lines = (self.line + text).split("\n")
+        self.line = lines.pop()
+        for line in lines:
+            if line.lstrip().startswith("####"):
+                with _lock:
+                    _clear_progress()
+                    self.stream.write(line + "\n")
+        return len(text)
+
+    def flush(self):
+        self.stream.flush()
+
+
+class _OrderedOutput:
+    """sys.stdout replacement that keeps output in submission order while the pool runs."""
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def write(self, text):
+        buffer = getattr(_local, "buffer", None)
+        if buffer is not None:
+            buffer.write(text)  # a worker: captured with its task
+        else:
+            _pending.append(text)  # the main thread: queued behind running tasks
+        return len(text)
+
+    def flush(self):
+        pass
+
+
+def _run_captured(fn, args):
+    _local.buffer = io.StringIO()
+    try:
+        mb_profile.call(fn, *args)
+        return _local.buffer.getvalue(), None
+    except Exception as e:
+        return _local.buffer.getvalue(), e
+    finally:
+        _local.buffer = None
+
+
+def _drain(limit):
+    """Write out finished output in order; block on the oldest task while more than limit are queued."""
+    while _pending:
+        head = _pending[0]
+        if not isinstance(head, (str, tuple)) and not head.done() and len(_pending) <= limit:
+            break
+        _pending.popleft()  # before raising, so a failed task is reported once
+        if isinstance(head, str):
+            _console.write(head)
+        elif isinstance(head, tuple):
+            fn, args = head
+            fn(*args)
+        else:
+            text, error = head.result()
+            _console.write(text)
+            if error is not None:
+                raise error
+
+
+def submit(fn, *args):
+    """Run fn(*args) for one file, on the worker pool when --jobs is more than 1."""
+    if _pool is None:
+        mb_profile.call(fn, *args)
+        return
+    _pending.append(_pool.submit(_run_captured, fn, args))
+    _drain(jobs * 4)
+
+
+def after_jobs(fn, *args):
+    """Run fn(*args) on the main thread once every file submitted so far is processed."""
+    if _pool is None:
+        fn(*args)
+        return
+    _pending.append((fn, args))
+    _drain(jobs * 4)
+
+
+def count(key, n=1):
+    with _lock:
+        stats[key] += n
+        if quiet:
+            _progress()
+
+
+def add_time(name, seconds):
+    with _lock:
+        phase_times[name] += seconds
+
+
+@contextmanager
+def timed(name):
+    """Book the wall time of the with-block under a phase of phase_times."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        add_time(name, time.perf_counter() - started)
+
+
+class LibraryDir(NamedTuple):
+    """One directory of walk_library()."""
+    root: str
+    level: tuple   # (mbPL, phase, level) as find_level() returns it
+    files: list    # os.DirEntry of the files, in listing order
+    matches: bool  # False if root does not match the filter: its files are to be skipped
+
+
+# a level literal of a filter regex, e.g. mbP5L33; a trailing digit under a
+# quantifier is not part of it (mbP5L33? is mbP5L3)
+LEVEL_LITERAL = re.compile(r"mbP\d+L\d+(?![?*{])", re.IGNORECASE)
+
+
+def pinned_levels(filter):
+    """Return the level prefixes a filter regex ties every match to (lowercase), or None.
+
+    A filter ties its matches to a level only when it starts with a level
+    literal and has no alternation: "mbP5L33" -> ("mbp5l33",),
+    "mbP5L3[3-6]" -> ("mbp5l3",). A level behind a group, quantifier or
+    lookaround may be optional or excluded ("(mbP5L33)?Honesty",
+    "^((?!mbP5L33).)*$"), as may any level of "mbP5L33|Honesty"; such
+    filters do not prune the walk.
+    """
+    if not filter or "|" in filter:
+        return None
+    match = LEVEL_LITERAL.match(filter)
+    return (match.group(0).lower(),) if match else None
+
+
+def code_digest():
+    """Digest of the source of the library's modules loaded in this run, so a changed rule re-walks every level."""
+    global _code_digest
+    if _code_digest is None:
+        here = os.path.dirname(os.path.abspath(__file__))
+        digest = hashlib.sha1()
+        for name, module in sorted(sys.modules.items()):
+            path = getattr(module, "__file__", None)
+            if path and path.endswith(".py") and os.path.dirname(os.path.abspath(path)) == here:
+                with open(path, 'rb') as f:
+                    digest.update(name.encode('utf-8') + b"\0" + f.read())
+        _code_digest = digest.hexdigest()
+    return _code_digest
+
+
+def level_unchanged(root):
+    """True if the level folder root is recorded as fully processed and has not changed since."""
+    state = cache.directory_state(root)
+    if state is None or state[1] != code_digest():
+        return False
+    with timed("walk"):
+        return directory_fingerprint(root) == state[0]
+
+
+def _level_started(root):
+    _level_planned[root] = stats["planned"]
+
+
+def _store_level(root):
+    with timed("walk"):
+        fingerprint = directory_fingerprint(root)
+    if fingerprint is not None:
+        cache.store_directory(root, fingerprint, code_digest())
+
+
+def _level_done(root, complete):
+    """Record a walked level folder, unless part of it was filtered out or changes are only planned."""
+    if complete and stats["planned"] == _level_planned.pop(root):
+        _store_level(root)
+
+
+def record_walked_levels():
+    """Record the level folders walked with record_levels=False; call once all their files are processed.
+
+    Nothing is recorded in a run that only planned changes.
+    """
+    if not stats["planned"]:
+        for root, complete in walked_levels:
+            if complete:
+                _store_level(root)
+    del walked_levels[:]
+
+
+def walk_library(path, filter=None, skip_unchanged=False, record_levels=True):
+    """Walk path top-down with os.scandir, yielding a LibraryDir per directory in os.walk order.
+
+    .git directories are not entered. The level of each directory is worked
+    out once, from its parent's, and the files come as os.DirEntry so their
+    stat results can be reused. With a filter regex (searched in the
+    directory path, ignoring case), a non-matching directory is yielded with
+    matches=False; a level folder that does not match a filter naming other
+    levels is yielded that way without being listed or entered, so
+    --filter mbP5L33 only lists that level's folders. The time spent listing
+    directories is booked under the walk phase.
+
+    With skip_unchanged and a scan cache, a level folder this rule set fully
+    processed before, and that has not changed since, is neither listed nor
+    yielded (its path is added to skipped_levels). Every other level folder
+    is recorded once the files submitted for it are processed; a caller that
+    tags the files only after the walk passes record_levels=False and calls
+    record_walked_levels() when done.
+    """
+    skip_unchanged = skip_unchanged and cache is not None
+    pattern = re.compile(filter, re.IGNORECASE) if filter else None
+    levels = pinned_levels(filter)
+    # (root, level, name of root, listed, tracked); popped last pushed first.
+    # A tracked level folder is followed by an end marker with name None,
+    # popped once everything below it is walked.
+    stack = [(path, find_level(path), os.path.basename(os.path.abspath(path)), True, False)]
+    tracked = []  # [level folder, whether all of it matched the filter] of the tracked folders being walked
+    while stack:
+        root, level, name, listed, track = stack.pop()
+        if name is None:
+            level_root, complete = tracked.pop()
+            if record_levels:
+                after_jobs(_level_done, level_root, complete)
+            else:
+                walked_levels.append((level_root, complete))
+            continue
+        matches = pattern is None or pattern.search(root) is not None
+        if track:
+            cache.forget_directory(root)
+            tracked.append([root, True])
+            if record_levels:
+                after_jobs(_level_started, root)
+        if tracked and not matches:
+            tracked[-1][1] = False
+        if not listed:
+            yield LibraryDir(root, level, [], False)
+            continue
+
+        started = time.perf_counter()
+        files, subdirs = [], []
+        try:
+            with os.scandir(root) as entries:
+                for entry in entries:
+                    try:
+                        is_dir = entry.is_dir()
+                    except OSError:
+                        is_dir = False
+                    if not is_dir:
+                        files.append(entry)
+                    elif entry.name != ".git" and not entry.is_symlink():
+                        subdirs.append(entry)
+        except OSError:
+            pass  # unreadable directory: skipped, as os.walk does
+        add_time("walk", time.perf_counter() - started)
+        yield LibraryDir(root, level, files, matches)
+
+        for entry in reversed(subdirs):
+            child = os.path.join(root, entry.name)
+            child_level = find_child_level(name, entry.name)
+            listed = True
+            if child_level and levels and not pattern.search(child):
+                listed = child_level[0].lower().startswith(levels)
+            track = bool(child_level) and listed and skip_unchanged
+            if track and level_unchanged(child):
+                count("levels_skipped")
+                skipped_levels.append(child)
+                continue
+            if track:
+                stack.append((child, None, None, False, False))
+            stack.append((child, child_level or level, entry.name, listed, track))
+
+
+def _progress_line():
+    elapsed = time.perf_counter() - _started
+    rate = stats['files'] / elapsed if elapsed > 0 else 0.0
+    planned = f", planned {stats['planned']}" if plan_file is not None else ""
+    return (f"walked {stats['walked']}, classified {stats['classified']}, parsed {stats['parses']}, "
+            f"updated {stats['updated']}{planned}, unchanged {stats['unchanged']}, skipped {stats['skipped']} "
+            f"| {rate:.0f} files/s")
+
+
+def _progress(force=False):
+    """Redraw the --quiet progress line, at most twice a second (called with _lock held)."""
+    global _progress_at, _progress_width
+    now = time.perf_counter()
+    if not force and now - _progress_at < 0.5:
+        return
+    _progress_at = now
+    line = _progress_line()
+    _progress_width = max(_progress_width, len(line))
+    sys.__stderr__.write("\r" + line.ljust(_progress_width))
+    sys.__stderr__.flush()
+
+
+def _clear_progress():
+    if _progress_width:
+        sys.__stderr__.write("\r" + " " * _progress_width + "\r")
+
+
+def add_arguments(p):
+    """Add the options shared by all update scripts to an ArgumentParser."""
+    p.add_argument("--cache", help=f"scan cache file (default: <scan_dir>/{CACHE_FILE_NAME})", default=None, type=str)
+    p.add_argument("--no-cache", help="open every file instead of skipping unchanged ones", action="store_true")
+    p.add_argument("--rebuild-cache", help="invalidate this script's cached results before scanning", action="store_true")
+    p.add_argument("--jobs", help="number of files to process in parallel", default=1, type=int)
+    p.add_argument("--plan", help="write the pending tag changes to this JSONL file instead of changing any file", default=None, type=str)
+    p.add_argument("--no-fast-path", help="always parse MP3 tags with mutagen, even when they already match", action="store_true")
+    p.add_argument("--quiet", help="show a progress line instead of a line per file (errors are still printed)", action="store_true")
+    p.add_argument("--metrics", help="also write the counters and phase times of the run to this JSON file", default=None, type=str)
+    mb_profile.add_arguments(p)
+
+
+def configure(args, rule):
+    """Apply the shared options; rule names the script's rule set in the scan cache."""
+    global cache, plan_file, fast_path, metrics_path, rule_name, quiet, _console, jobs, _pool, _started
+    rule_name = rule
+    if not getattr(args, "no_cache", True):
+        cache_path = args.cache or os.path.join(args.scan_dir, CACHE_FILE_NAME)
+        cache = ScanCache(cache_path, rule, invalidate=args.rebuild_cache)
+        duplicates.update(load_duplicate_paths(cache_path))
+
+    if getattr(args, "plan", None):
+        plan_file = open(args.plan, 'w', encoding='utf-8')
+    fast_path = not getattr(args, "no_fast_path", False)
+    metrics_path = getattr(args, "metrics", None)
+
+    quiet = getattr(args, "quiet", False)
+    if quiet:
+        _console = _QuietOutput(sys.stdout)
+        sys.stdout = _console
+
+    jobs = max(1, getattr(args, "jobs", 1))
+    if jobs > 1:
+        _pool = ThreadPoolExecutor(max_workers=jobs)
+        sys.stdout = _OrderedOutput(_console)
+    _started = time.perf_counter()
+    mb_profile.start(args)
+
+
+def wait_for_jobs():
+    """Wait until all submitted files are processed and their output is written.
+
+    With --quiet, the progress line ends here: the reports a script prints
+    after its files are processed, and the summary, are printed in full.
+    """
+    global _pool, _console
+    if _pool is not None:
+        _drain(0)
+        _pool.shutdown()
+        _pool = None
+        sys.stdout = _console
+    if isinstance(_console, _QuietOutput):
+        with _lock:
+            _progress(force=True)
+            sys.__stderr__.write("\n")
+        _console = _console.stream
+        sys.stdout = _console
+
+
+def drain_jobs():
+    """Wait until all submitted files are processed, keeping the worker pool for more work."""
+    if _pool is not None:
+        _drain(0)
+
+
+def finish():
+    """Wait for queued work, print the run summary and flush the scan cache and plan."""
+    wait_for_jobs()
+    print_summary()
+    mb_profile.report()
+    if metrics_path:
+        write_metrics(metrics_path)
+    if cache is not None:
+        cache.close()
+    if plan_file is not None:
+        plan_file.close()
+
+
+def record_plan(full_path, kind, changes):
+    """Write the pending changes of one file to the plan, one JSON line per field."""
+    lines = "".join(json.dumps({"path": os.path.abspath(full_path), "kind": kind, "field": field, "old": old, "new": new},
+                               ensure_ascii=False) + "\n"
+                    for field, old, new in changes)
+    with _lock:
+        plan_file.write(lines)
+        stats["planned"] += 1
+
+
+def cache_lookup(full_path, *expected, st=None):
+    """Return (hit, digest): hit is True if the file is unchanged since it last matched expected."""
+    if cache is None:
+        return False, None
+    digest = expected_digest(*expected)
+    return cache.lookup(full_path, digest, st) is not None, digest
+
+
+def cache_store(full_path, digest, header_hash=None):
+    if cache is not None:
+        cache.store(full_path, digest, "ok", header_hash)
+
+
+# iTunes atoms of the MP4 files, by their name in the tag index
+MP4_INDEX_NAMES = {'\xa9nam': "title", '\xa9alb': "album", '\xa9ART': "artist", '\xa9gen': "genre", '\xa9cmt': "comment"}
+
+
+def index_tags(full_path, kind, expected_tags, comment_text=None, replace=True):
+    """Record the tags a file carries after the run in the tag index of the scan cache.
+
+    Files found unchanged in the cache are only added if missing (replace=False).
+    """
+    if cache is None:
+        return
+    if kind == "video":
+        tags = {MP4_INDEX_NAMES[key]: value for key, value in expected_tags.items() if key in MP4_INDEX_NAMES}
+    else:
+        tags = dict(expected_tags)
+        if comment_text is not None:
+            tags["comment"] = comment_text
+    cache.index_tags(full_path, kind, tags, replace)
+
+
+def load_id3(full_path):
+    """Parse the ID3 tag of a file, or start an empty one if it has none."""
+    try:
+        return ID3(full_path)
+    except ID3NoHeaderError:
+        return ID3()
+
+
+def get_easy_tag(tags, key):
+    """Read an EasyID3-style field (e.g. 'title') from a loaded ID3 tag."""
+    try:
+        return EasyID3.Get[key](tags, key)[0]
+    except (KeyError, IndexError):
+        return None
+
+
+def set_easy_tag(tags, key, value):
+    """Write an EasyID3-style field (e.g. 'title') into a loaded ID3 tag.
+
+    An empty value removes the field, as ID3 does not store empty text frames.
+    """
+    if value == "":
+        if get_easy_tag(tags, key) is not None:
+            EasyID3.Delete[key](tags, key)
+    else:
+        EasyID3.Set[key](tags, key, [value])
+
+
+def get_comment(tags):
+    """Return the text of the first COMM frame, or None."""
+    for comm in tags.getall("COMM"):
+        return "/".join(comm.text)
+    return None
+
+
+def comment_matches(tags, comment_text):
+    """True if the tag holds comment_text as its English comment; an empty comment_text matches no comment."""
+    if comment_text == "":
+        return not any("".join(comm.text) for comm in tags.getall("COMM"))
+    for comm in tags.getall("COMM"):
+        if comm.lang == 'eng' and comm.desc == '' and comm.text == [comment_text]:
+            return True
+    return False
+
+
+def diff_audio_tags(tags, expected_tags, comment_text=None):
+    """Compare a loaded ID3 tag with the expected tags.
+
+    Returns a list of (field, old, new) tuples, empty if nothing differs.
+    The comment is reported under the 'comment' field. An empty expected
+    value matches a missing field.
+    """
+    changes = []
+    for key, value in expected_tags.items():
+        current_value = get_easy_tag(tags, key)
+        if value == "" and current_value in (None, ""):
+            continue
+        if current_value != value:
+            changes.append((key, current_value, value))
+
+    if comment_text is not None and not comment_matches(tags, comment_text):
+        changes.append(("comment", get_comment(tags), comment_text))
+
+    return changes
+
+
+def apply_audio_changes(tags, changes):
+    """Apply (field, old, new) changes to a loaded ID3 tag, in memory only."""
+    for key, _, value in changes:
+        if key == "comment":
+            tags.delall("COMM")
+            if value != "":
+                tags.add(COMM(encoding=3, lang='eng', desc='', text=value))
+        else:
+            set_easy_tag(tags, key, value)
+
+
+def save_id3(tags, full_path):
+    """Save a loaded ID3 tag using the library-wide version and padding policy.
+
+    Returns (in_place, bytes_written).
+    """
+    fits = []
+
+    def padding_policy(info):
+        fits.append(info.padding >= 0)
+        if info.padding >= 0:
+            return info.padding  # keep the tag size: patch in place
+        return PADDING_BUDGET
+
+    if ID3_VERSION == 3:
+        # update_to_v23() drops v2.4-only frames; keep the disc subtitle (TSST)
+        # that the Phrase Vault, MSLK and LI tags rely on
+        tsst = tags.getall("TSST")
+        tags.update_to_v23()
+        tags.setall("TSST", tsst)
+    old_size = tags.size  # 0 for a file without an ID3 tag
+    tags.save(full_path, v2_version=ID3_VERSION, padding=padding_policy)
+
+    in_place = old_size > 0 and fits[0]
+    if in_place:
+        return True, old_size
+    # the audio payload after the tag was moved as well
+    return False, os.path.getsize(full_path)
+
+
+def report_rewrite(file, result):
+    """Print a note when an MP4 could not be updated in place and had to be rewritten."""
+    if result["kind"] == "video" and result["writes"] and not result["in_place"]:
+        print(f">> !!! No room for the tags in place, video rewritten [{file}]: {result['bytes_written']} bytes written")
+
+
+def new_result(kind="audio"):
+    return {"kind": kind, "changes": [], "parses": 0, "writes": 0, "in_place": False, "bytes_written": 0,
+            "cached": False, "planned": False, "stale": False}
+
+
+def count_result(result):
+    count("files")
+    count("parses", result["parses"])
+    count("writes", result["writes"])
+    if not result["planned"]:  # a planned file is counted by record_plan
+        count("updated" if result["changes"] else "unchanged")
+    if result["writes"]:
+        count("in_place" if result["in_place"] else "rewritten")
+        count("bytes_written", result["bytes_written"])
+        if result["kind"] == "video":
+            count("video_writes")
+            count("video_rewritten", 0 if result["in_place"] else 1)
+            count("video_bytes_written", result["bytes_written"])
+
+
+def mp4_tag_region(full_path):
+    """Return (offset, length) of the iTunes tags of an MP4 file: the ilst atom plus the free atom after it."""
+    with open(full_path, 'rb') as f:
+        meta = Atoms(f).path(b"moov", b"udta", b"meta")[-1]
+    children = meta.children
+    for i, atom in enumerate(children):
+        if atom.name == b"ilst":
+            length = atom.length
+            if i + 1 < len(children) and children[i + 1].name == b"free":
+                length += children[i + 1].length
+            return atom.offset, length
+    raise KeyError("ilst")
+
+
+def save_mp4(video, full_path):
+    """Save a loaded MP4 file with mutagen's default padding; returns (in_place, bytes_written) like save_id3."""
+    fits = []
+
+    def padding_policy(info):
+        fits.append(info.padding >= 0)
+        return info.get_default_padding()
+
+    video.save(padding=padding_policy)
+
+    offset, length = mp4_tag_region(full_path)
+    if fits[0]:
+        return True, length
+    # everything after the tags (usually the whole media data) was moved
+    return False, os.path.getsize(full_path) - offset
+
+
+def update_audio_tags(full_path, expected_tags, comment_text=None, st=None):
+    """Bring the tags of an MP3 file in line with expected_tags and comment_text.
+
+    The file is parsed once and saved at most once. Returns a per-file result:
+    {"kind": "audio", "changes": [(field, old, new), ...], "parses": n, "writes": n,
+     "in_place": bool, "bytes_written": n, "cached": bool, "planned": bool, "stale": bool}
+
+    With a scan cache, a file that has not changed since it last matched the
+    same expected tags is not opened at all. A file whose tag region already
+    holds the expected frames is confirmed by mb_id3_fast without building
+    mutagen objects. With --plan, the changes are recorded in the plan and
+    the file is not written. st is the os.stat() result of the file, if the
+    caller already has one from walking its directory.
+    """
+    result = new_result()
+
+    with timed("cache"):
+        hit, digest = cache_lookup(full_path, expected_tags, comment_text, ID3_VERSION, st=st)
+        if hit:
+            index_tags(full_path, "audio", expected_tags, comment_text, replace=False)
+    if hit:
+        result["cached"] = True
+        count_result(result)
+        return result
+
+    frames = expected_frames(expected_tags) if fast_path else None
+    if frames is not None:
+        with timed("parse"):
+            matches = audio_tags_match(full_path, frames, comment_text)
+        if matches:
+            count("fast")
+            with timed("cache"):
+                cache_store(full_path, digest, tag_header_hash(full_path))
+                index_tags(full_path, "audio", expected_tags, comment_text)
+            count_result(result)
+            return result
+
+    twin_key, twin = find_twin(full_path, expected_tags, comment_text)
+    if twin is not None:
+        count("reused")
+        changes = twin[0]
+    else:
+        with timed("parse"):
+            tags = load_id3(full_path)
+        result["parses"] += 1
+
+        with timed("compare"):
+            changes = diff_audio_tags(tags, expected_tags, comment_text)
+    result["changes"] = changes
+    if changes and plan_file is not None:
+        record_plan(full_path, "audio", changes)
+        result["planned"] = True
+    else:
+        if changes:
+            with timed("write"):
+                if twin is not None:
+                    result["in_place"], result["bytes_written"] = write_id3_bytes(full_path, twin[1])
+                else:
+                    apply_audio_changes(tags, changes)
+                    result["in_place"], result["bytes_written"] = save_id3(tags, full_path)
+            result["writes"] += 1
+        with timed("cache"):
+            cache_store(full_path, digest, tag_header_hash(full_path))
+            index_tags(full_path, "audio", expected_tags, comment_text)
+    if twin_key is not None and twin is None:
+        remember_twin(twin_key, full_path, changes, result)
+
+    count_result(result)
+    return result
+
+
+def find_twin(full_path, expected_tags, comment_text):
+    """Return (key, twin): the remembered result of a copy of a duplicate file, or (None, None).
+
+    twin is None as well when the copy's changes cannot be reused here: they
+    were not saved (--plan), or this file also has an ID3v1 tag to update.
+    """
+    if not duplicates or os.path.abspath(full_path) not in duplicates:
+        return None, None
+    with timed("parse"):
+        key = (tag_header_hash(full_path), expected_digest(expected_tags, comment_text, ID3_VERSION))
+        with _lock:
+            twin = _twins.get(key)
+        if twin is not None and twin[0] and plan_file is None and (twin[1] is None or has_id3v1(full_path)):
+            twin = None
+    return key, twin
+
+
+def remember_twin(key, full_path, changes, result):
+    tag = None
+    if changes and result["writes"] and not has_id3v1(full_path):
+        tag = id3_tag_bytes(full_path)
+    with _lock:
+        _twins.setdefault(key, (changes, tag))
+
+
+def write_id3_bytes(full_path, tag):
+    """Replace the ID3 tag of a file with tag (header included); returns (in_place, bytes_written).
+
+    A tag of the same size is written over the old one; otherwise the audio
+    after the old tag is moved, as mutagen does.
+    """
+    old = id3_tag_bytes(full_path)
+    old_size = len(old) if old is not None else 0
+    with open(full_path, 'r+b') as f:
+        if old_size == len(tag):
+            f.write(tag)
+            return True, len(tag)
+        f.seek(old_size)
+        payload = f.read()
+        f.seek(0)
+        f.write(tag)
+        f.write(payload)
+        f.truncate()
+    return False, len(tag) + len(payload)
+
+
+def diff_video_tags(video, expected_tags):
+    """Compare a loaded MP4 file with the expected atoms; returns (field, old, new) tuples.
+
+    An empty expected value matches a missing atom.
+    """
+    changes = []
+    for key, value in expected_tags.items():
+        current_value = video.get(key, [None])[0]
+        if value == "" and current_value in (None, ""):
+            continue
+        if current_value != value:
+            changes.append((key, current_value, value))
+    return changes
+
+
+def apply_video_changes(video, changes):
+    """Apply (atom, old, new) changes to a loaded MP4 file, in memory only; an empty value removes the atom."""
+    for key, _, value in changes:
+        if value == "":
+            video.pop(key, None)
+        else:
+            video[key] = value
+
+
+def update_video_tags(full_path, expected_tags, st=None):
+    """Bring the iTunes atoms of an MP4 file (e.g. '\xa9nam') in line with expected_tags.
+
+    Returns the same per-file result as update_audio_tags.
+    """
+    result = new_result("video")
+
+    with timed("cache"):
+        hit, digest = cache_lookup(full_path, expected_tags, st=st)
+        if hit:
+            index_tags(full_path, "video", expected_tags, replace=False)
+    if hit:
+        result["cached"] = True
+        count_result(result)
+        return result
+
+    with timed("parse"):
+        video = MP4(full_path)
+    result["parses"] += 1
+
+    with timed("compare"):
+        changes = diff_video_tags(video, expected_tags)
+    result["changes"] = changes
+    if changes and plan_file is not None:
+        record_plan(full_path, "video", changes)
+        result["planned"] = True
+    else:
+        if changes:
+            with timed("write"):
+                apply_video_changes(video, changes)
+                result["in_place"], result["bytes_written"] = save_mp4(video, full_path)
+            result["writes"] += 1
+        with timed("cache"):
+            cache_store(full_path, digest)
+            index_tags(full_path, "video", expected_tags)
+
+    count_result(result)
+    return result
+
+
+def current_artwork(tags, kind):
+    """Return the sha1 of the single cover image a loaded file holds, or None (no image, or several)."""
+    images = tags.get("covr", []) if kind == "video" else tags.getall("APIC")
+    if len(images) != 1:
+        return None
+    return digest_of(bytes(images[0]) if kind == "video" else images[0].data)
+
+
+def update_artwork(full_path, kind, artwork, st=None):
+    """Embed an mb_artwork.Artwork as the only cover image of an MP3 (APIC) or MP4 (covr) file.
+
+    A file that already holds exactly this image, compared by hash, is not
+    written. Returns the same per-file result as update_audio_tags, with one
+    ("artwork", old sha1, new sha1) change.
+    """
+    result = new_result(kind)
+
+    with timed("cache"):
+        hit, digest = cache_lookup(full_path, "artwork", artwork.digest, st=st)
+    if hit:
+        result["cached"] = True
+        count_result(result)
+        return result
+
+    with timed("parse"):
+        tags = MP4(full_path) if kind == "video" else load_id3(full_path)
+    result["parses"] += 1
+
+    with timed("compare"):
+        old = current_artwork(tags, kind)
+        changes = [("artwork", old, artwork.digest)] if old != artwork.digest else []
+    result["changes"] = changes
+    if changes and plan_file is not None:
+        record_plan(full_path, "artwork", changes)
+        result["planned"] = True
+    else:
+        if changes:
+            with timed("write"):
+                if kind == "video":
+                    image_format = MP4Cover.FORMAT_PNG if artwork.mime == "image/png" else MP4Cover.FORMAT_JPEG
+                    tags["covr"] = [MP4Cover(artwork.data, imageformat=image_format)]
+                    result["in_place"], result["bytes_written"] = save_mp4(tags, full_path)
+                else:
+                    tags.setall("APIC", [APIC(encoding=0, mime=artwork.mime, type=3, desc="", data=artwork.data)])
+                    result["in_place"], result["bytes_written"] = save_id3(tags, full_path)
+            result["writes"] += 1
+        with timed("cache"):
+            cache_store(full_path, digest, tag_header_hash(full_path) if kind == "audio" else None)
+
+    count_result(result)
+    return result
+
+
+def apply_planned_changes(full_path, kind, changes):
+    """Apply (field, old, new) changes taken from a plan to one file, with one parse and one save.
+
+    If a field no longer holds its planned old value, the file changed since
+    the plan was made and is left alone (result["stale"]).
+    """
+    result = new_result(kind)
+
+    with timed("parse"):
+        if kind == "video":
+            tags = MP4(full_path)
+        else:
+            tags = load_id3(full_path)
+    result["parses"] += 1
+
+    with timed("compare"):
+        if kind == "video":
+            current = {key: tags.get(key, [None])[0] for key, _, _ in changes}
+        else:
+            current = {key: get_comment(tags) if key == "comment" else get_easy_tag(tags, key)
+                       for key, _, _ in changes}
+        stale = any(current[key] != old for key, old, _ in changes)
+    if stale:
+        result["stale"] = True
+        count("stale")
+        count("files")
+        count("parses", result["parses"])
+        return result
+
+    result["changes"] = changes
+    if changes:
+        with timed("write"):
+            if kind == "video":
+                apply_video_changes(tags, changes)
+                result["in_place"], result["bytes_written"] = save_mp4(tags, full_path)
+            else:
+                apply_audio_changes(tags, changes)
+                result["in_place"], result["bytes_written"] = save_id3(tags, full_path)
+        result["writes"] += 1
+
+    count_result(result)
+    return result
+
+
+def print_summary():
+    """Print the run totals collected by update_audio_tags."""
+    elapsed = time.perf_counter() - _started
+    rate = stats['files'] / elapsed if elapsed > 0 else 0.0
+    if stats["walked"]:
+        print(f"Walked: {stats['walked']}, classified: {stats['classified']}, skipped: {stats['skipped']}")
+    planned = f", planned: {stats['planned']}" if plan_file is not None else ""
+    print(f"Files: {stats['files']}, updated: {stats['updated']}{planned}, unchanged: {stats['unchanged']}, "
+          f"tag parses: {stats['parses']}, writes: {stats['writes']}")
+    print(f"Writes patched in place: {stats['in_place']}, rewritten fully: {stats['rewritten']}, "
+          f"bytes written: {stats['bytes_written']}")
+    if stats["video_writes"]:
+        print(f"Video writes: {stats['video_writes']}, rewritten fully: {stats['video_rewritten']}, "
+              f"bytes written per video update: {stats['video_bytes_written'] // stats['video_writes']}")
+    if plan_file is not None:
+        print(f"Plan [{plan_file.name}]: {stats['planned']} file(s) with pending changes, no file was written")
+    if stats["fast"]:
+        print(f"Confirmed unchanged from the raw tag bytes: {stats['fast']} file(s)")
+    if stats["reused"]:
+        print(f"Reused the result of a duplicate with the same tag: {stats['reused']} file(s)")
+    if stats["stale"]:
+        print(f"Skipped {stats['stale']} file(s) that changed since the plan was made")
+    if stats["levels_skipped"]:
+        print(f"Level folders skipped as unchanged: {stats['levels_skipped']}")
+    print(f"Elapsed: {elapsed:.2f} s, {rate:.1f} files/s with {jobs} job(s)")
+    print("Phase times" + (" (summed over jobs)" if jobs > 1 else "") + ": "
+          + ", ".join(f"{name} {seconds:.2f} s" for name, seconds in phase_times.items()))
+    if cache is not None:
+        print(f"Scan cache [{cache.path}]: hits: {cache.hits}, misses: {cache.misses}")
+
+
+def write_metrics(path):
+    """Write the counters and phase times of the run as JSON."""
+    metrics = {
+        "rule": rule_name,
+        "jobs": jobs,
+        "elapsed": round(time.perf_counter() - _started, 3),
+        "counters": stats,
+        "phases": {name: round(seconds, 3) for name, seconds in phase_times.items()},
+    }
+    if cache is not None:
+        metrics["cache"] = {"path": cache.path, "hits": cache.hits, "misses": cache.misses}
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(metrics, f, indent=2)
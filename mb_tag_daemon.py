@@ -0,0 +1,175 @@
+# /// script
+# requires-python = ">=3.8"
+# dependencies = [
+#     "mutagen",
+# ]
+# ///
+
+import io
+import os
+import sys
+import json
+import time
+import threading
+import argparse
+import socketserver
+from contextlib import contextmanager
+import mb_tag_core
+import update_mb_all_tags as all_tags
+from mb_tag_core import drain_jobs, add_arguments, configure, finish
+from mb_story_catalog import StoryCatalog
+
+# Warm tagging daemon. Starting Python, importing mutagen and opening the
+# scan cache and story catalog costs more than tagging the few files a small
+# incremental run touches, so this process does it once and then serves
+# requests from mb_tag_client.py over a local TCP socket (127.0.0.1 only):
+#
+#   {"cmd": "tag", "path": <file or folder>}  tag a file, or every file of a
+#                                             subtree, with the rules of
+#                                             update_mb_all_tags.py
+#   {"cmd": "health"}                         liveness, uptime, busy or not
+#   {"cmd": "stats"}                          counters of all requests so far
+#   {"cmd": "shutdown"}                       print the summary and stop
+#
+# One JSON request line per connection, one JSON response line back. Tag
+# requests run one at a time; health and stats are answered meanwhile.
+
+DEFAULT_PORT = 48765
+MEDIA_EXTENSIONS = ('.mp3', '.mp4')
+
+library_root = None
+_tag_lock = threading.Lock()
+_count_lock = threading.Lock()
+_started = time.monotonic()
+requests_served = 0
+last_request = None
+
+
+@contextmanager
+def captured_output():
+    """Collect everything printed while tagging, instead of writing it to the daemon's console."""
+    buffer = io.StringIO()
+    saved_console, saved_stdout = mb_tag_core._console, sys.stdout
+    mb_tag_core._console = buffer  # where the --jobs output queue drains to
+    if mb_tag_core._pool is None:
+        sys.stdout = buffer
+    try:
+        yield buffer
+    finally:
+        drain_jobs()
+        mb_tag_core._console, sys.stdout = saved_console, saved_stdout
+
+
+def in_library(path):
+    root = os.path.abspath(library_root)
+    return os.path.commonpath([root, path]) == root
+
+
+def tag_path(path):
+    """Tag one media file, or every media file below a folder; returns the response of a tag request."""
+    global last_request
+    path = os.path.abspath(path)
+    if not in_library(path):
+        return {"ok": False, "error": f"[{path}] is outside the library [{os.path.abspath(library_root)}]"}
+    if not os.path.exists(path):
+        return {"ok": False, "error": f"[{path}] does not exist"}
+
+    with _tag_lock:
+        # start empty: a request that raised left its results behind
+        del all_tags.unmatched[:], all_tags.ambiguous[:]
+        all_tags.rule_counts.clear()
+        before = dict(mb_tag_core.stats)
+        started = time.perf_counter()
+        with captured_output() as output:
+            if os.path.isdir(path):
+                all_tags.find_files_with_extension(path, MEDIA_EXTENSIONS)
+            else:
+                root = os.path.dirname(path)
+                files = [entry.name for entry in os.scandir(root) if entry.is_file()]
+                media = [os.path.basename(path)] if path.lower().endswith(MEDIA_EXTENSIONS) else []
+                print(f"-| {root} | -")  # current directory path
+                all_tags.process_listing(root, files, media)
+            drain_jobs()
+            for full_path in all_tags.unmatched:
+                print(f"Skipping {os.path.basename(full_path)}: matches no rule")
+        unmatched, ambiguous = len(all_tags.unmatched), len(all_tags.ambiguous)
+        all_tags.catalog.save()
+        if mb_tag_core.cache is not None:
+            mb_tag_core.cache.commit()
+
+        elapsed = time.perf_counter() - started
+        counters = {key: mb_tag_core.stats[key] - before[key] for key in before if mb_tag_core.stats[key] != before[key]}
+        last_request = {"path": path, "elapsed": elapsed, "counters": counters}
+    return {"ok": True, "path": path, "elapsed": elapsed, "counters": counters,
+            "unmatched": unmatched, "ambiguous": ambiguous, "output": output.getvalue()}
+
+
+def health():
+    return {"ok": True, "status": "ok", "pid": os.getpid(), "library": os.path.abspath(library_root),
+            "uptime": time.monotonic() - _started, "requests": requests_served, "busy": _tag_lock.locked()}
+
+
+def stats():
+    cache = mb_tag_core.cache
+    return {"ok": True, "requests": requests_served, "uptime": time.monotonic() - _started,
+            "counters": dict(mb_tag_core.stats), "phases": dict(mb_tag_core.phase_times),
+            "cache": {"hits": cache.hits, "misses": cache.misses} if cache is not None else None,
+            "catalog": len(all_tags.catalog.entries), "duplicates": len(mb_tag_core.duplicates),
+            "jobs": mb_tag_core.jobs, "last_request": last_request}
+
+
+class Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        global requests_served
+        cmd = None
+        try:
+            request = json.loads(self.rfile.readline())
+            cmd = request.get("cmd")
+            if cmd == "tag":
+                response = tag_path(request["path"])
+            elif cmd == "health":
+                response = health()
+            elif cmd == "stats":
+                response = stats()
+            elif cmd == "shutdown":
+                response = {"ok": True, "status": "stopping"}
+            else:
+                response = {"ok": False, "error": f"unknown command [{cmd}]"}
+        except Exception as e:
+            response = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+        with _count_lock:
+            requests_served += 1
+        self.wfile.write((json.dumps(response, ensure_ascii=False) + "\n").encode('utf-8'))
+        self.wfile.flush()
+        if cmd == "shutdown":
+            threading.Thread(target=self.server.shutdown).start()
+
+
+class Server(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser()
+    p.add_argument("scan_dir", help="library folder to serve tag requests for", nargs="?", default='.', type=str)
+    p.add_argument("--port", help="TCP port on 127.0.0.1 to listen on", default=DEFAULT_PORT, type=int)
+    add_arguments(p)
+    args = p.parse_args()
+    configure(args, "all")
+
+    library_root = args.scan_dir
+    all_tags.catalog = StoryCatalog(args.scan_dir)
+    all_tags.catalog.refresh()
+    all_tags.catalog.save()
+
+    with Server(("127.0.0.1", args.port), Handler) as server:
+        print(f"Serving tag requests for [{args.scan_dir}] on 127.0.0.1:{args.port} "
+              f"({len(all_tags.catalog.entries)} TITLE INFO file(s) in the catalog), Ctrl+C to stop")
+        drain_jobs()  # with --jobs, printed text is queued until drained
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+    print("Daemon stopped")
+    finish()
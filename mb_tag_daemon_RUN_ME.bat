@@ -0,0 +1,5 @@
+@echo off
+pushd "%DROPBOX_TEAM%\Documents\Language\Chinese\mandarin blueprint"
+python "scripts\mb_tag_daemon.py" %*
+popd
+pause
\ No newline at end of file
@@ -0,0 +1,135 @@
+import os
+import re
+import sys
+import json
+import sqlite3
+import argparse
+from mb_scan_cache import CACHE_FILE_NAME, INDEX_FIELDS
+
+# Queries the tag index the update scripts keep in the scan cache, without
+# opening any media file, and exports the matches as M3U8 playlists.
+#
+# A filter is <field><op><value>, on a field of the index (title, album,
+# artist, genre, comment, discnumber, discsubtitle, tracknumber, kind, path):
+#   album=mbP5L3*             is (* and ? are wildcards)
+#   title~Full Story          contains
+#   album!=LLR, title!~Slower is not, does not contain
+# Text is compared without case, as Apple Music does. All filters must match.
+# A matching file that no longer exists is dropped from the index.
+#
+# All update scripts must share one index, at the library root: run the
+# ones started in a subfolder with --cache <library>/.mb_tag_cache.sqlite
+# (the RUN_ME.bat files do).
+
+FIELDS = INDEX_FIELDS + ["kind", "path"]
+FILTER_PATTERN = re.compile(r"(\w+)(!=|!~|=|~)(.*)", re.DOTALL)
+
+
+def like_escape(text):
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def parse_filter(text):
+    """Turn a filter into (SQL condition, parameter); raises ValueError for a malformed one."""
+    match = FILTER_PATTERN.fullmatch(text)
+    if not match or match.group(1) not in FIELDS:
+        raise ValueError(f"filter [{text}] is not <field>=<value> or <field>~<value> "
+                         f"with a field of {', '.join(FIELDS)}")
+    field, op, value = match.groups()
+    if op in ("~", "!~"):
+        pattern = "%" + like_escape(value) + "%"
+    else:
+        pattern = like_escape(value).replace("*", "%").replace("?", "_")
+    if op.startswith("!"):
+        return f"({field} IS NULL OR {field} NOT LIKE ? ESCAPE '\\')", pattern
+    return f"{field} LIKE ? ESCAPE '\\'", pattern
+
+
+def query_tags(db, filters):
+    """Return the index rows (dicts) matching all filters, by album then path."""
+    conditions, params = [], []
+    for text in filters:
+        condition, param = parse_filter(text)
+        conditions.append(condition)
+        params.append(param)
+    where = " WHERE " + " AND ".join(conditions) if conditions else ""
+    db.row_factory = sqlite3.Row
+    rows = [dict(row) for row in db.execute(f"SELECT * FROM tags{where} ORDER BY album, path", params)]
+    return drop_missing(db, rows)
+
+
+def drop_missing(db, rows):
+    """Remove the rows of files deleted since they were indexed, from the result and from the index."""
+    missing = {row["path"] for row in rows if not os.path.exists(row["path"])}
+    if missing:
+        db.executemany("DELETE FROM tags WHERE path = ?", [(path,) for path in missing])
+        db.commit()
+        print(f"Dropped {len(missing)} deleted file(s) from the tag index")
+    return [row for row in rows if row["path"] not in missing]
+
+
+def m3u8_text(rows):
+    lines = ["#EXTM3U"]
+    for row in rows:
+        lines.append(f"#EXTINF:-1,{row['title'] or os.path.basename(row['path'])}")
+        lines.append(row["path"])
+    return "\n".join(lines) + "\n"
+
+
+def write_if_changed(path, text):
+    """Write a playlist unless the file already holds exactly this text; returns True if written."""
+    try:
+        with open(path, encoding='utf-8') as f:
+            if f.read() == text:
+                return False
+    except FileNotFoundError:
+        pass
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w', encoding='utf-8', newline='\n') as f:
+        f.write(text)
+    return True
+
+
+def export_playlist(db, name, filters, path):
+    rows = query_tags(db, filters)
+    written = write_if_changed(path, m3u8_text(rows))
+    print(f"Playlist [{name}]: {len(rows)} file(s), {'written' if written else 'unchanged'} [{path}]")
+    return written
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser()
+    p.add_argument("scan_dir", help="library folder the update scripts were run on", nargs="?", default='.', type=str)
+    p.add_argument("--cache", help=f"scan cache file holding the tag index (default: <scan_dir>/{CACHE_FILE_NAME})", default=None, type=str)
+    p.add_argument("--where", help="filter, e.g. album=mbP5L3* or title~Paragraph (repeat to combine)", action="append", default=[])
+    p.add_argument("--m3u8", help="write the matching files to this M3U8 playlist", default=None, type=str)
+    p.add_argument("--playlists", help='JSON file of playlists to regenerate: {"<name>": ["<filter>", ...], ...}', default=None, type=str)
+    p.add_argument("--out-dir", help="folder for the --playlists files (default: <scan_dir>/playlists)", default=None, type=str)
+    args = p.parse_args()
+
+    cache_path = args.cache or os.path.join(args.scan_dir, CACHE_FILE_NAME)
+    if not os.path.exists(cache_path):
+        print(f"#### ---- No tag index [{cache_path}]: run the update scripts with the scan cache first")
+        sys.exit(1)
+    db = sqlite3.connect(cache_path)
+
+    try:
+        if args.playlists:
+            with open(args.playlists, encoding='utf-8') as f:
+                playlists = json.load(f)
+            out_dir = args.out_dir or os.path.join(args.scan_dir, "playlists")
+            written = sum(export_playlist(db, name, filters, os.path.join(out_dir, f"{name}.m3u8"))
+                          for name, filters in playlists.items())
+            print(f"{written} of {len(playlists)} playlist(s) changed")
+        elif args.m3u8:
+            export_playlist(db, os.path.splitext(os.path.basename(args.m3u8))[0], args.where, args.m3u8)
+        else:
+            rows = query_tags(db, args.where)
+            for row in rows:
+                print(f"{row['path']} | {row['title']} | {row['album']}")
+            print(f"{len(rows)} file(s) match")
+    except (ValueError, sqlite3.OperationalError) as e:
+        print(f"#### ---- {e}")
+        sys.exit(1)
+    finally:
+        db.close()
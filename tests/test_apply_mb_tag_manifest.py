@@ -0,0 +1,47 @@
+import os
+import sys
+import json
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from mutagen.id3 import ID3
+from mutagen.mp4 import MP4
+from mb_synthetic_library import generate
+
+
+def apply_manifest(manifest, library):
+    run = subprocess.run([sys.executable, os.path.join(ROOT, "apply_mb_tag_manifest.py"), manifest, library, "--no-cache"],
+                         capture_output=True, text=True, check=True)
+    return run.stdout
+
+
+def test_second_run_with_empty_values_reports_unchanged(tmp_path):
+    library = str(tmp_path / "library")
+    generate(library)
+    mp3 = os.path.join("MSLK", sorted(os.listdir(os.path.join(library, "MSLK")))[0])
+    mp4 = next(os.path.relpath(os.path.join(root, name), library)
+               for root, _, files in os.walk(library) for name in files if name.endswith(".mp4"))
+
+    # give both files a comment and an album, then remove them with empty values
+    set_values = str(tmp_path / "set.jsonl")
+    clear_values = str(tmp_path / "clear.jsonl")
+    with open(set_values, 'w', encoding='utf-8') as f:
+        for path in (mp3, mp4):
+            f.write(json.dumps({"path": path, "album": "Album", "comment": "Comment"}) + "\n")
+    with open(clear_values, 'w', encoding='utf-8') as f:
+        for path in (mp3, mp4):
+            f.write(json.dumps({"path": path, "album": "", "comment": ""}) + "\n")
+    apply_manifest(set_values, library)
+
+    first = apply_manifest(clear_values, library)
+    assert first.count("--> UPDATED") == 2
+    second = apply_manifest(clear_values, library)
+    assert "--> UPDATED" not in second
+    assert second.count("-- No change") == 2
+
+    tags = ID3(os.path.join(library, mp3))
+    assert not tags.getall("COMM") and not tags.getall("TALB")
+    video = MP4(os.path.join(library, mp4))
+    assert '\xa9cmt' not in video and '\xa9alb' not in video
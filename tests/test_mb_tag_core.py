@@ -0,0 +1,38 @@
+import os
+import sys
+import argparse
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import mb_tag_core
+
+
+def fail(message):
+    raise ValueError(message)
+
+
+def test_failed_job_is_raised_once():
+    done = []
+    mb_tag_core.configure(argparse.Namespace(jobs=2), "test")
+    try:
+        with pytest.raises(ValueError, match="first batch"):
+            mb_tag_core.submit(fail, "first batch")
+            mb_tag_core.drain_jobs()
+
+        # the next batch runs normally instead of raising the first error again
+        mb_tag_core.submit(done.append, "second batch")
+        mb_tag_core.drain_jobs()
+    finally:
+        mb_tag_core.wait_for_jobs()
+    assert done == ["second batch"]
+
+
+def test_only_a_leading_level_literal_prunes_the_walk():
+    assert mb_tag_core.pinned_levels("mbP5L33") == ("mbp5l33",)
+    assert mb_tag_core.pinned_levels("mbP5L3[3-6]") == ("mbp5l3",)
+    assert mb_tag_core.pinned_levels("mbP5L33?") == ("mbp5l3",)
+    for filter in ("mbP5L33|Honesty", "(mbP5L33)?Honesty", "^((?!mbP5L33).)*$", "Honesty.*mbP5L33", None):
+        assert mb_tag_core.pinned_levels(filter) is None
@@ -0,0 +1,168 @@
+# /// script
+# requires-python = ">=3.8"
+# dependencies = [
+#     "mutagen",
+# ]
+# ///
+
+import os
+import argparse
+from mb_classifier import classify_listing, find_level
+from mb_story_catalog import StoryCatalog, is_title_info, print_errors
+from mb_tag_core import update_audio_tags, update_video_tags, report_rewrite, submit, count, walk_library, wait_for_jobs, add_arguments, configure, finish, skipped_levels
+import update_mb_tpv_tags as tpv
+import update_mb_mslk_tags as mslk
+import update_mb_li_tags as li
+import update_mb_sentence_tags as sentence
+import update_mb_story_tags as story
+
+# Walks the whole library once and applies the TPV, MSLK, LI, sentence and
+# story rules in a single pass, instead of running the five scripts.
+
+# An MSLK filename is also a valid Phrase Vault filename; the MSLK rule wins.
+OVERRIDES = {"mslk": "tpv"}
+
+RULE_MODULES = {"tpv": tpv, "mslk": mslk, "li": li}
+
+catalog = None  # StoryCatalog of the library, set up by main
+rule_counts = {}
+unmatched = []
+ambiguous = []
+
+def load_stories(root, files):
+    """Load the TITLE INFO*.json files of a directory as (content, album) pairs plus their compiled patterns.
+
+    The files are read through the story catalog, so unchanged files are not read again.
+    """
+    stories = []
+    patterns = []
+    for file in sorted(files):
+        if not is_title_info(file):
+            continue
+        full_path = os.path.join(root, file)
+        entry = catalog.entry(full_path)
+        album = entry["mbPL"]
+        if not album:
+            continue
+        if entry["error"]:
+            print(f"#### ---- Error in JSON file [{full_path}]: error [{entry['error']}]")
+            continue
+        content = entry["content"]
+        stories.append((content, album))
+        patterns.append(story.compile_patterns(content))
+    return stories, patterns
+
+def expected_for(match, mbPL, stories):
+    """Return (kind, expected_tags, comment_text) for a FilenameMatch."""
+    if match.rule in RULE_MODULES:
+        module = RULE_MODULES[match.rule]
+        return "audio", module.get_expected_tags(match), module.COMMENT_TEXT
+    if match.rule == "sentence":
+        expected_tags = sentence.get_expected_tags(sentence.sentence_title(match.title), mbPL)
+        return "audio", expected_tags, sentence.COMMENT_TEXT
+
+    content, album = stories[match.story]
+    if match.rule == "story_audio":
+        expected_tags = story.get_expected_tags(story.audio_title(match.gender, match.speed, content), album)
+        return "audio", expected_tags, story.COMMENT_TEXT
+    return "video", story.get_expected_video_tags(story.video_title(match.gender, content), album), None
+
+def resolve(matches, mbPL, stories):
+    """Turn the FilenameMatches of a file into distinct (rule, kind, expected_tags, comment_text) results."""
+    results = []
+    for match in matches:
+        result = (match.rule,) + expected_for(match, mbPL, stories)
+        # the same result found twice (e.g. via two TITLE INFO files) is one match
+        if result not in results:
+            results.append(result)
+
+    rules = {r[0] for r in results}
+    for rule, overridden in OVERRIDES.items():
+        if rule in rules:
+            results = [r for r in results if r[0] != overridden]
+    return results
+
+def apply_rule(file, full_path, rule, kind, expected_tags, comment_text, entry=None):
+    # the stat result of the directory walk saves the scan cache a stat call
+    st = entry.stat() if entry is not None else None
+    if kind == "video":
+        result = update_video_tags(full_path, expected_tags, st)
+    else:
+        result = update_audio_tags(full_path, expected_tags, comment_text, st)
+
+    if result["changes"]:
+        print(f"--> UPDATED [{rule}] [{file}]")
+        report_rewrite(file, result)
+    else:
+        print(f"-- No change [{rule}] [{file}]")
+
+def find_files_with_extension(path, extensions):
+    """Walk the library once, classifying every file with the given extensions against all rule sets.
+
+    Level folders unchanged since this script last processed them are skipped (see walk_library).
+    """
+    for directory in walk_library(path, skip_unchanged=True):
+        root = directory.root
+        print(f"-| {root} | -")  # current directory path
+        files = [entry.name for entry in directory.files]
+        media = [file for file in files if file.lower().endswith(extensions)]
+        process_listing(root, files, media, directory.level, {entry.name: entry for entry in directory.files})
+
+def process_listing(root, files, media, level=None, entries=None):
+    """Classify the media files of one directory and apply the rule each of them matches.
+
+    files is the whole directory listing (for its TITLE INFO files), media the
+    files to tag, level the (mbPL, phase, level) of root if already known,
+    entries the os.DirEntry of each file name if root was listed by a walk.
+    """
+    # media files are matched against the TITLE INFO files next to them
+    stories, patterns = load_stories(root, files)
+    level = level or find_level(root)
+    mbPL, mbP, mbL = level
+
+    for file, file_matches in classify_listing(root, media, patterns, level):
+        full_path = os.path.join(root, file)
+        count("walked")
+
+        matches = resolve(file_matches, mbPL, stories)
+        if not matches:
+            unmatched.append(full_path)
+            count("skipped")
+        elif len(matches) > 1:
+            ambiguous.append((full_path, [m[0] for m in matches]))
+            print(f"Skipping {file}: matches more than one rule {[m[0] for m in matches]}")
+            count("skipped")
+        else:
+            rule, kind, expected_tags, comment_text = matches[0]
+            rule_counts[rule] = rule_counts.get(rule, 0) + 1
+            count("classified")
+            submit(apply_rule, file, full_path, rule, kind, expected_tags, comment_text,
+                   entries.get(file) if entries else None)
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser()
+    p.add_argument("scan_dir", help="library folder to scan for MP3 and MP4 files", nargs="?", default='.', type=str)
+    p.add_argument("--rebuild-catalog", help="re-read every TITLE INFO file instead of the changed ones", action="store_true")
+    add_arguments(p)
+    args = p.parse_args()
+    configure(args, "all")
+
+    catalog = StoryCatalog(args.scan_dir, rebuild=args.rebuild_catalog)
+    print(f"Scanning directory [{args.scan_dir}] for MP3 and MP4 files...")
+    find_files_with_extension(args.scan_dir, ('.mp3', '.mp4'))
+    wait_for_jobs()
+    catalog.forget_unseen(keep=skipped_levels)
+    catalog.save()
+
+    print(">> ------- files per rule -------")
+    for rule, n in sorted(rule_counts.items()):
+        print(f"{rule}: {n}")
+    print(f">> ------- files matching no rule: {len(unmatched)} -------")
+    for full_path in unmatched:
+        print(full_path)
+    print(f">> ------- files matching more than one rule: {len(ambiguous)} -------")
+    for full_path, rules in ambiguous:
+        print(f"{full_path}: {', '.join(rules)}")
+    print_errors(catalog)
+
+    finish()
@@ -0,0 +1,5 @@
+@echo off
+pushd "%DROPBOX_TEAM%\Documents\Language\Chinese\mandarin blueprint"
+python "scripts\update_mb_all_tags.py" %*
+popd
+pause
\ No newline at end of file
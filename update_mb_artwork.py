@@ -0,0 +1,84 @@
+# /// script
+# requires-python = ">=3.8"
+# dependencies = [
+#     "mutagen",
+# ]
+# ///
+
+import os
+import sys
+import argparse
+from mutagen.mp4 import MP4
+import mb_tag_core
+from mb_tag_core import (update_artwork, load_id3, get_easy_tag, report_rewrite, submit, count, timed,
+                         walk_library, add_arguments, configure, finish)
+from mb_artwork import ArtworkCache, ART_DIR_NAME, ART_CACHE_DIR_NAME
+
+# Embeds cover art per album or collection into every MP3 (APIC) and MP4
+# (covr) file of the library; see mb_artwork.py for how the images are
+# named, encoded and cached. The album of a file is taken from the tag index
+# the update scripts keep in the scan cache, so run them first; a file not
+# in the index has its album read from its tags. Files that already hold
+# the image are recognised by its hash and not written.
+
+MEDIA_EXTENSIONS = ('.mp3', '.mp4')
+
+indexed_albums = {}
+artwork = None  # ArtworkCache
+
+
+def read_album(full_path, kind):
+    with timed("parse"):
+        if kind == "video":
+            return MP4(full_path).get('\xa9alb', [None])[0]
+        return get_easy_tag(load_id3(full_path), "album")
+
+
+def set_artwork(file, full_path, st):
+    kind = "video" if file.lower().endswith('.mp4') else "audio"
+    album = indexed_albums.get(os.path.abspath(full_path))
+    if album is None:
+        album = read_album(full_path, kind)
+    image = artwork.for_album(album)
+    if image is None:
+        print(f"Skipping {file}: no artwork for album [{album}]")
+        count("skipped")
+        return
+    count("classified")
+
+    result = update_artwork(full_path, kind, image, st=st)
+    if result["changes"]:
+        print(f"--> UPDATED [{file}]")
+        report_rewrite(file, result)
+    else:
+        print(f"-- No change [{file}]")
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser()
+    p.add_argument("scan_dir", help="folder to scan for MP3 and MP4 files", nargs="?", default='.', type=str)
+    p.add_argument("--art-dir", help=f"folder of the source images, named after their album (default: <scan_dir>/{ART_DIR_NAME})", default=None, type=str)
+    p.add_argument("--art-cache", help=f"folder of the encoded images (default: <scan_dir>/{ART_CACHE_DIR_NAME})", default=None, type=str)
+    add_arguments(p)
+    args = p.parse_args()
+
+    art_dir = args.art_dir or os.path.join(args.scan_dir, ART_DIR_NAME)
+    if not os.path.isdir(art_dir):
+        print(f"#### ---- No artwork folder [{art_dir}]")
+        sys.exit(1)
+    configure(args, "artwork")
+    artwork = ArtworkCache(art_dir, args.art_cache or os.path.join(args.scan_dir, ART_CACHE_DIR_NAME))
+    if mb_tag_core.cache is not None:
+        indexed_albums = mb_tag_core.cache.indexed_albums()
+
+    print(f"Embedding {len(artwork.sources)} image(s) from [{art_dir}] into the files under [{args.scan_dir}]...")
+    for directory in walk_library(args.scan_dir):
+        root = directory.root
+        print(f"-| {root} | -")  # current directory path
+        for entry in directory.files:
+            if entry.name.lower().endswith(MEDIA_EXTENSIONS):
+                count("walked")
+                submit(set_artwork, entry.name, os.path.join(root, entry.name), entry.stat())
+
+    finish()
+    print(f"Artwork: {artwork.encoded} image(s) encoded, {artwork.reused} read from the cache")
@@ -1,5 +1,5 @@
 @echo off
 pushd "%DROPBOX_TEAM%\Documents\Language\Chinese\mandarin blueprint\language islands\audio files"
-python "%DROPBOX_TEAM%\Documents\Language\Chinese\mandarin blueprint\scripts\update_mb_li_tags.py"
+python "%DROPBOX_TEAM%\Documents\Language\Chinese\mandarin blueprint\scripts\update_mb_li_tags.py" --cache "%DROPBOX_TEAM%\Documents\Language\Chinese\mandarin blueprint\.mb_tag_cache.sqlite"
 popd
 pause
\ No newline at end of file
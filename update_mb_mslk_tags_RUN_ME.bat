@@ -1,5 +1,5 @@
 @echo off
 pushd "%DROPBOX_TEAM%\Documents\Language\Chinese\mandarin blueprint\MSLK"
-python "%DROPBOX_TEAM%\Documents\Language\Chinese\mandarin blueprint\scripts\update_mb_mslk_tags.py"
+python "%DROPBOX_TEAM%\Documents\Language\Chinese\mandarin blueprint\scripts\update_mb_mslk_tags.py" --cache "%DROPBOX_TEAM%\Documents\Language\Chinese\mandarin blueprint\.mb_tag_cache.sqlite"
 popd
 pause
\ No newline at end of file
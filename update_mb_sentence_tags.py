@@ -3,8 +3,10 @@ import re
 # import msvcrt
 import json
 import sys
-from mutagen.easyid3 import EasyID3
-from mutagen.id3 import ID3, COMM
+from mb_classifier import match_sentence
+from mb_tag_core import update_audio_tags, submit, after_jobs, count, walk_library, wait_for_jobs, add_arguments, configure, finish
+from mb_run_report import open_report, print_report
+import mb_run_report
 import argparse
 
 ARTIST_NAME = "Mandarin Blueprint"
@@ -13,87 +15,63 @@ COMMENT_TEXT = "The Mandarin Blueprint Method"
 
 current_dir = ""
 mbPL = None  # Global variable to store the current mbP and L
-file_status = {}
+report = None  # RunReport of the run, set up by main
 filter = None  # Global variable to store the filter, if any
 
 def add_file(full_path):
-    if full_path not in file_status:
-        file_status[full_path] = "<== UNMATCHED"
+    report.add(full_path)
     
 def file_processed(full_path, status):
-    file_status[full_path] = status
+    report.set(full_path, status)
         
-def find_files_with_extension(path, extension, callback, p = None):
-    """Find all files with the given extension in the current directory and subdirectories."""
+def find_files_with_extension(path, extension, callback):
+    """Find all files with the given extension in the current directory and subdirectories.
+
+    Level folders that cannot match the filter are not entered; callback gets
+    the os.DirEntry of each file and the level of its directory.
+    """
     global current_dir
     print(f"Scanning {path}\\ for [{extension}] files...")
-    for root, dirs, files in os.walk(path):
+    for directory in walk_library(path, filter, skip_unchanged=True):
+        root = directory.root
         if not current_dir == root:
-            if ".git" in root:
-                continue  # Skip git directories
-            
             print("==============================================================================================")
             print(f"--| {root} |--")  # current directory path
             print("----------------------------------------------------------------------------------------------")
             current_dir = root
 
             # check if there is a filter and whether the file matches it
-            if filter:
-                match = re.search(filter, root, re.IGNORECASE) 
-                if not match:
-                    print(f"Skipping [{root}]: does not match filter [{filter}]")
-                    continue
+            if not directory.matches:
+                print(f"Skipping [{root}]: does not match filter [{filter}]")
+                continue
+            if report.is_done(root):
+                print(f"Skipping [{root}]: done in the resumed run")
+                continue
 
-        for file in files:
-            if file.lower().endswith(extension):
-                full_path = os.path.join(root, file)
+        for entry in directory.files:
+            if entry.name.lower().endswith(extension):
+                full_path = os.path.join(root, entry.name)
 
                 print(f"Processing file: {full_path}")
-                callback(file, full_path, p)
-
-# Ensure files can be tagged if no ID3 tag exists
-def ensure_id3(filename):
-    try:
-        EasyID3(filename)
-    except Exception:
-        audio = ID3()
-        audio.save(filename)
-
-def set_audio_tags(file, full_path, title):
-    ensure_id3(full_path)
+                count("walked")
+                callback(entry, full_path, directory.level)
+        after_jobs(report.directory_done, root)
 
-    expected_tags = {
+def get_expected_tags(title, album):
+    return {
         'title': title,
-        'album': mbPL,
+        'album': album,
         'artist': ARTIST_NAME,
         'genre': GENRE
     }
 
-    audio = EasyID3(full_path)
-    modified = False
-
-    for key, value in expected_tags.items():
-        current_value = audio.get(key, [None])[0]
-        if current_value != value:
-            audio[key] = value
-            modified = True
+def set_audio_tags(file, full_path, title, album, entry=None):
+    expected_tags = get_expected_tags(title, album)
 
-    if modified:
-        audio.save()
-
-    # Add comment using full ID3
-    full_tags = ID3(full_path)
-    current_comm = full_tags.getall("COMM")
-    comment_needed = True
-    for comm in current_comm:
-        if comm.lang == 'eng' and comm.desc == '' and comm.text == [COMMENT_TEXT]:
-            comment_needed = False
-            break
-
-    if comment_needed:
-        full_tags.delall("COMM")
-        full_tags.add(COMM(encoding=3, lang='eng', desc='', text=COMMENT_TEXT))
-        full_tags.save(v2_version=3)
+    # the stat result of the directory walk saves the scan cache a stat call
+    st = entry.stat() if entry is not None else None
+    result = update_audio_tags(full_path, expected_tags, COMMENT_TEXT, st)
+    modified = bool(result["changes"])
 
     if modified:
         print(f">> === Updated [{file}]")
@@ -102,10 +80,16 @@ def set_audio_tags(file, full_path, title):
         print(f">> -- No change [{file}]")
         file_processed(full_path, "<-- no change")
         
-def check_audio_filename_pattern(file, full_path, param):
+def sentence_title(mbL):
+    # Example: L24 All Sentences Combined.mp3
+    return rf"L{mbL} All Sentences Combined"
+
+def check_audio_filename_pattern(entry, full_path, level):
     global mbPL
-    mbPL, mbP, mbL = find_mp_PandL(full_path)
+    file = entry.name
+    mbPL, mbP, mbL = level
     if mbPL is None:
+        count("skipped")
         return
     
     # Remove the file extension from the filename
@@ -113,36 +97,32 @@ def check_audio_filename_pattern(file, full_path, param):
     
     # Only bother with files containing "All Sentences Combined"
     if "All Sentences Combined" not in base:
+        count("skipped")
         return
 
     add_file(full_path)
 
-    # Example: L24 All Sentences Combined.mp3
-    pat = rf"L{mbL} All Sentences Combined"
-    match = re.match(pat, base)
+    pat = sentence_title(mbL)
+    match = match_sentence(file, mbL)
     if match:
         print(f"MATCH: title=[{pat}]")
-        set_audio_tags(file, full_path, pat)
+        count("classified")
+        submit(set_audio_tags, file, full_path, pat, mbPL, entry)
 
     else:
         print(f"Skipping [{base}]:")
+        count("skipped")
         print(f"#### --- format [{pat}] not matched")
 
-def find_mp_PandL(full_path):
-    full_path = os.path.abspath(full_path)
-    # check if the path contains a valid Mandarin Blueprint Phase and Level
-    pat = r".*mandarin blueprint.(mbP(\d{1,2})L(\d{1,3}))"
-    match = re.match(pat, full_path)
-    if match:
-        return match.groups()[0], match.groups()[1], match.groups()[2]
-    return None, None, None
-      
-      
 if __name__ == "__main__":
     p = argparse.ArgumentParser()
     p.add_argument("scan_dir", help="folder to scan for MP3 files", nargs="?", default='.', type=str)
     p.add_argument("--filter", help="regex file filter", required=False, default='.*', type=str)
+    mb_run_report.add_arguments(p)
+    add_arguments(p)
     args = p.parse_args()
+    configure(args, "sentence")
+    report = open_report(args, "sentence")
 
     print(f"Scanning directory [{args.scan_dir}] for MP3 files...")
           
@@ -158,8 +138,11 @@ if __name__ == "__main__":
     print(">> ------- looking for SENTENCE files -------")
     find_files_with_extension(args.scan_dir, '.mp3', check_audio_filename_pattern)
 
-    for fname, status in file_status.items():
-        print(f"{fname}: {status}")
+    wait_for_jobs()
+    report.close()
+    print_report(report)
+
+    finish()
         
     #print("Press any key to exit...")
     #msvcrt.getch()
\ No newline at end of file
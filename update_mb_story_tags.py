@@ -8,11 +8,12 @@
 import os
 import re
 # import msvcrt
-import json
 import sys
-from mutagen.easyid3 import EasyID3
-from mutagen.id3 import ID3, COMM
-from mutagen.mp4 import MP4
+from mb_classifier import compile_story_patterns
+from mb_story_catalog import StoryCatalog, print_errors
+from mb_tag_core import update_audio_tags, update_video_tags, report_rewrite, submit, after_jobs, count, wait_for_jobs, record_walked_levels, add_arguments, configure, finish
+from mb_run_report import open_report, print_report
+import mb_run_report
 import argparse
 
 ARTIST_NAME = "Mandarin Blueprint"
@@ -20,26 +21,28 @@ GENRE = "Language Learning"
 COMMENT_TEXT = "The Mandarin Blueprint Method"
 
 current_dir = ""
-mbPL = None  # Global variable to store the current mbP and L
-file_status = {}
+report = None  # RunReport of the run, set up by main
 filter = None  # Global variable to store the filter, if any
 
 def add_file(full_path):
-    if full_path not in file_status:
-        file_status[full_path] = "<== UNMATCHED"
+    report.add(full_path)
     
 def file_processed(full_path, status):
-    file_status[full_path] = status
+    report.set(full_path, status)
         
-def find_files_with_extension(path, extension, callback, p = None):
-    """Find all files with the given extension in the current directory and subdirectories."""
+def find_story_files(catalog):
+    """Tag the media files next to every TITLE INFO file of the story catalog, one directory at a time.
+
+    Each directory is listed once, by the catalog refresh; process_JSON_file()
+    also gets the os.DirEntry of all files in the same directory.
+    """
     global current_dir
-    print(f"Scanning [{path}]\\ for [{extension}] files...")
-    for root, dirs, files in os.walk(path):
+    print(f"Scanning [{catalog.root}]\\ for [TITLE INFO] files, catalog [{catalog.path}]...")
+    for directory, entries in catalog.by_directory().items():
+        if os.path.join(directory, "").startswith(catalog.skipped):
+            continue  # level folder unchanged since it was last tagged
+        root = os.path.join(catalog.root, directory)
         if not current_dir == root:
-            if ".git" in root:
-                continue  # Skip git directories
-            
             print("==============================================================================================")
             print(f"--| {root} |--")  # current directory path
             print("----------------------------------------------------------------------------------------------")
@@ -51,60 +54,40 @@ def find_files_with_extension(path, extension, callback, p = None):
                 if not match:
                     print(f"Skipping [{root}]: does not match filter [{filter}]")
                     continue
-
-        for file in files:
-            if file.lower().endswith(extension):
-                full_path = os.path.join(root, file)
-
-                print(f"Processing file: {full_path}")
-                callback(file, full_path, p)
-
-# Ensure files can be tagged if no ID3 tag exists
-def ensure_id3(filename):
-    try:
-        EasyID3(filename)
-    except Exception:
-        audio = ID3()
-        audio.save(filename)
-
-def clean_title(parts):
-    return " ".join(parts).replace("_", " ")
-
-def set_audio_tags(file, full_path, title):
-    ensure_id3(full_path)
-
-    expected_tags = {
+            if report.is_done(root):
+                print(f"Skipping [{root}]: done in the resumed run")
+                continue
+
+        try:
+            files = catalog.listings.get(directory)
+            if files is None:  # a folder the filter kept out of the catalog refresh
+                files = [entry for entry in os.scandir(root) if entry.is_file()]
+        except OSError as e:
+            # a folder the filter kept out of the catalog refresh, removed since
+            print(f"#### ---- Cannot list [{root}]: error [{e}]")
+            continue
+        for file, entry in entries:
+            full_path = os.path.join(root, file)
+
+            print(f"Processing file: {full_path}")
+            process_JSON_file(file, full_path, files, entry)
+        after_jobs(report.directory_done, root)
+
+def get_expected_tags(title, album):
+    return {
         'title': title,
-        'album': mbPL,
+        'album': album,
         'artist': ARTIST_NAME,
         'genre': GENRE
     }
 
-    audio = EasyID3(full_path)
-    modified = False
-
-    for key, value in expected_tags.items():
-        current_value = audio.get(key, [None])[0]
-        if current_value != value:
-            audio[key] = value
-            modified = True
-
-    if modified:
-        audio.save()
-
-    # Add comment using full ID3
-    full_tags = ID3(full_path)
-    current_comm = full_tags.getall("COMM")
-    comment_needed = True
-    for comm in current_comm:
-        if comm.lang == 'eng' and comm.desc == '' and comm.text == [COMMENT_TEXT]:
-            comment_needed = False
-            break
+def set_audio_tags(file, full_path, title, album, file_entry=None):
+    expected_tags = get_expected_tags(title, album)
 
-    if comment_needed:
-        full_tags.delall("COMM")
-        full_tags.add(COMM(encoding=3, lang='eng', desc='', text=COMMENT_TEXT))
-        full_tags.save(v2_version=3)
+    # the stat result of the directory listing saves the scan cache a stat call
+    st = file_entry.stat() if file_entry is not None else None
+    result = update_audio_tags(full_path, expected_tags, COMMENT_TEXT, st)
+    modified = bool(result["changes"])
 
     if modified:
         print(f">> === Updated [{file}]")
@@ -113,176 +96,134 @@ def set_audio_tags(file, full_path, title):
         print(f">> -- No change [{file}]")
         file_processed(full_path, "<-- no change")
         
-def set_video_tags(file, full_path, title):
-    video = MP4(full_path)
-    expected_tags = {
+def get_expected_video_tags(title, album):
+    return {
         '\xa9nam': title,  # Title
-        '\xa9alb': mbPL,  # Album
+        '\xa9alb': album,  # Album
         '\xa9ART': ARTIST_NAME,  # Artist
         '\xa9gen': GENRE,  # Genre
         '\xa9cmt': COMMENT_TEXT  # Comment
     }
 
-    modified = False
+def set_video_tags(file, full_path, title, album, file_entry=None):
+    expected_tags = get_expected_video_tags(title, album)
 
-    for key, value in expected_tags.items():
-        current_value = video.get(key, [None])[0]
-        if current_value != value:
-            video[key] = value
-            modified = True
+    st = file_entry.stat() if file_entry is not None else None
+    result = update_video_tags(full_path, expected_tags, st)
+    modified = bool(result["changes"])
 
-    if modified:
-        video.save()
-        
     if modified:
         print(f">> === Updated [{file}]")
+        report_rewrite(file, result)
         file_processed(full_path, "<== updated")
     else:
         print(f">> -- No change [{file}]")
         file_processed(full_path, "<-- no change")
         
         
-def load_and_validate(path):
-    with open(path, 'r', encoding='utf-8') as f:
-        data = json.load(f)
-
-    # Check top-level keys
-    if not all(k in data for k in ("title", "text")):
-        raise ValueError("Missing 'title' or 'text' keys")
-
-    for section in ("title", "text"):
-        item = data[section]
-
-        # Each section must be a dict with 'Chinese' and 'English'
-        if not isinstance(item, dict):
-            raise ValueError(f"{section} must be a dict")
-        if "Chinese" not in item or "English" not in item:
-            raise ValueError(f"{section} missing keys")
-
-        if not isinstance(item["Chinese"], str):
-            raise ValueError(f"{section}.Chinese must be a string")
-
-        # Normalize English to list of strings
-        eng = item["English"]
-        if isinstance(eng, str):
-            item["English"] = [eng]
-        elif isinstance(eng, list):
-            if not all(isinstance(s, str) for s in eng):
-                raise ValueError(f"{section}.English must be a string or list of strings")
-        else:
-            raise ValueError(f"{section}.English must be string or list of strings")
-
-    return data
+def compile_patterns(content):
+    """Compile one audio and one video filename pattern covering all English titles of a story."""
+    return compile_story_patterns(content["title"]["English"])
+
+def audio_title(gender, speed, content):
+    """Build the Chinese tag title from the gender and speed matched by the audio pattern."""
+    if gender.lower() == "female":
+        cn_gender = "女"
+    else:
+        cn_gender = "男"
+    if speed.lower() == "slower":
+        cn_speed = "慢话"
+    else:
+        cn_speed = "对话"
+    # print(f"MATCH: gender=[{gender},{cn_gender}] speed=[{speed},{cn_speed}]")
+    return f"{content['title']['Chinese']} - {cn_gender}{cn_speed} ({speed})"
+
+def video_title(gender, content):
+    """Build the Chinese tag title from the gender matched by the video pattern."""
+    if gender.lower() == "female":
+        cn_gender = "女"
+    else:
+        cn_gender = "男"
+    return f"{content['title']['Chinese']} - {cn_gender}"
 
-def check_audio_filename_pattern(file, full_path, content):
+def check_audio_filename_pattern(file, full_path, content, pattern, album, file_entry=None):
     add_file(full_path)
     
     # Remove the file extension from the filename
     base = os.path.splitext(file)[0]
 
-    for title in content["title"]["English"]:
-        print(f"- English title: [{title}]")
-        """Check if the audio filename matches the expected pattern ."""
-        # Example: AUDIO - <title> - [Paragraph #x] - EN<gender> (EN<speed>).mp3
-        pat = rf"AUDIO - {title} - (Male|Female) \((Slower|Native Speed)\)"
-        match = re.match(pat, base)
-        if match:
-            gender, speed = match.groups()
-            if gender.lower() == "female":
-                cn_gender = "女"
-            else:
-                cn_gender = "男"
-            if speed.lower() == "slower":
-                cn_speed = "慢话"
-            else:
-                cn_speed = "对话"
-            # print(f"MATCH: gender=[{gender},{cn_gender}] speed=[{speed},{cn_speed}]")
-            cn_title = f"{content['title']['Chinese']} - {cn_gender}{cn_speed} ({speed})"
-            print(f"MATCH: title=[{cn_title}]")
-            set_audio_tags(file, full_path, cn_title)
-
-        else:
-            print(f"Skipping [{base}]:")
-            print(f"#### --- format [{pat}] not matched")
+    match = pattern.match(base)
+    if match:
+        gender, speed = match.groups()
+        cn_title = audio_title(gender, speed, content)
+        print(f"MATCH: title=[{cn_title}]")
+        count("classified")
+        submit(set_audio_tags, file, full_path, cn_title, album, file_entry)
+    else:
+        print(f"Skipping [{base}]:")
+        count("skipped")
+        print(f"#### --- format [{pattern.pattern}] not matched")
 
-def find_audio_files(full_path, content):
+def find_audio_files(root, files, content, pattern, album):
     print(">> ------- looking for AUDIO files -------")
     print(f"Chinese title: [{content['title']['Chinese']}]")
     for title in content["title"]["English"]:
         print(f"English title: [{title}]")
     print(">> ------- looking for AUDIO files -------")
-    find_files_with_extension(full_path, '.mp3', check_audio_filename_pattern, content)
+    for file_entry in files:
+        file = file_entry.name
+        if file.lower().endswith('.mp3'):
+            full_path = os.path.join(root, file)
+            print(f"Processing file: {full_path}")
+            count("walked")
+            check_audio_filename_pattern(file, full_path, content, pattern, album, file_entry)
     
-def check_video_filename_pattern(file, full_path, content):
+def check_video_filename_pattern(file, full_path, content, pattern, album, file_entry=None):
     add_file(full_path)
     
     # Remove the file extension from the filename
     base = os.path.splitext(file)[0]
 
-    for title in content["title"]["English"]:
-        print(f"English title: [{title}]")
-        """Check if the audio filename matches the expected pattern ."""
-        # Example: AUDIO - <title> - [Paragraph #x] - EN<gender> (EN<speed>).mp3
-        pat = rf"VIDEO (MALE|FEMALE) - {title}"
-        match = re.match(pat, base)
-        if match:
-            gender = match.groups()[0]
-            print(f"gender = {gender}")
-            if gender.lower() == "female":
-                cn_gender = "女"
-            else:
-                cn_gender = "男"
-            # print(f"MATCH: gender=[{gender},{cn_gender}] speed=[{speed},{cn_speed}]")
-            cn_title = f"{content['title']['Chinese']} - {cn_gender}"
-            print(f"MATCH: title=[{cn_title}]")
-            set_video_tags(file, full_path, cn_title)
-        else:
-            print(f"Skipping [{base}]:")
-            print(f"#### --- format [{pat}] not matched")
+    match = pattern.match(base)
+    if match:
+        gender = match.groups()[0]
+        print(f"gender = {gender}")
+        cn_title = video_title(gender, content)
+        print(f"MATCH: title=[{cn_title}]")
+        count("classified")
+        submit(set_video_tags, file, full_path, cn_title, album, file_entry)
+    else:
+        print(f"Skipping [{base}]:")
+        count("skipped")
+        print(f"#### --- format [{pattern.pattern}] not matched")
         
-def find_video_files(full_path, content):
+def find_video_files(root, files, content, pattern, album):
     print(">> ------- looking for VIDEO files -------")
     print(f"Chinese title: [{content['title']['Chinese']}]")
     for title in content["title"]["English"]:
         print(f"English title: [{title}]")
     print(">> ------- looking for VIDEO files -------")
-    find_files_with_extension(full_path, '.mp4', check_video_filename_pattern, content)
-
-def find_mp_PandL(full_path):
-    full_path = os.path.abspath(full_path)
-    # check if the path contains a valid Mandarin Blueprint Phase and Level
-    pat = r".*mandarin blueprint.(mbP\d{1,2}L\d{1,3})"
-    match = re.match(pat, full_path)
-    if match:
-        return match.groups()[0]
-    return None
-    
-def process_JSON_file(file, full_path, p):
-    global mbPL
+    for file_entry in files:
+        file = file_entry.name
+        if file.lower().endswith('.mp4'):
+            full_path = os.path.join(root, file)
+            print(f"Processing file: {full_path}")
+            count("walked")
+            check_video_filename_pattern(file, full_path, content, pattern, album, file_entry)
+
+def process_JSON_file(file, full_path, files, entry):
+    """Tag the media files next to a TITLE INFO JSON file (files: os.DirEntry of its directory, entry: its catalog entry)."""
     # check if the path contains a valid Mandarin Blueprint Phase and Level
-    mbPL = find_mp_PandL(full_path)
+    mbPL = entry["mbPL"]
     if not mbPL:
         return
     print(f"Found mb P and L: [{mbPL}]")
     
-    # Remove the file extension from the filename
-    base = os.path.splitext(file)[0]
-
-    # Extract metadata from filename
-    # Example: TITLE INFO - Sleeping Beauty - Paragraph 1
-    # Try match with Paragraph number
-    match = re.match(r"TITLE INFO - (.*) - Paragraph (\d+)", base)
-    if match:
-        raw_title, parag_num = match.groups()
-    else:
-        # Fallback match without Part number, default to Part 1
-        match = re.match(r"TITLE INFO - (.*)", base)
-        if match:
-            raw_title = match.groups()[0]
-            parag_num  = "0"
-        else:
-            print(f"#### ---- Skipping [{file}]: format not matched")
-            return
+    # Example: TITLE INFO - Sleeping Beauty - Paragraph 1 (without Paragraph: 0)
+    raw_title, parag_num = entry["title"], entry["paragraph"]
+    if raw_title is None:
+        print(f"#### ---- Skipping [{file}]: format not matched")
+        return
 
     """Process JSON files to extract and print relevant information."""
     print("------- found JSON file -------")
@@ -291,20 +232,26 @@ def process_JSON_file(file, full_path, p):
     else:
         print(f"-- Title: [{raw_title}], Paragraph: [{parag_num}] --")
     
-    try:
-        content = load_and_validate(full_path)
-        if not content is None:
-            find_audio_files(os.path.dirname(full_path), content)
-            find_video_files(os.path.dirname(full_path), content)
-    
-    except json.JSONDecodeError as e:
-        print(f"#### ---- Error decoding JSON in file [{file}]: error [{e}]")
+    if entry["error"]:
+        print(f"#### ---- Error in JSON file [{file}]: error [{entry['error']}]")
+        return
+
+    content = entry["content"]
+    audio_pattern, video_pattern = compile_patterns(content)
+    root = os.path.dirname(full_path)
+    find_audio_files(root, files, content, audio_pattern, mbPL)
+    find_video_files(root, files, content, video_pattern, mbPL)
         
 if __name__ == "__main__":
     p = argparse.ArgumentParser()
     p.add_argument("scan_dir", help="folder to scan for MP3 files", nargs="?", default='.', type=str)
     p.add_argument("--filter", help="regex file filter", required=False, default='.*', type=str)
+    p.add_argument("--rebuild-catalog", help="re-read every TITLE INFO file instead of the changed ones", action="store_true")
+    mb_run_report.add_arguments(p)
+    add_arguments(p)
     args = p.parse_args()
+    configure(args, "story")
+    report = open_report(args, "story")
 
     print(f"Scanning directory [{args.scan_dir}] for MP3 files...")
           
@@ -317,10 +264,18 @@ if __name__ == "__main__":
         
     print(f"File filter: [{filter}]")
 
-    find_files_with_extension(args.scan_dir, '.json', process_JSON_file)
+    catalog = StoryCatalog(args.scan_dir, rebuild=args.rebuild_catalog)
+    catalog.refresh(filter, skip_unchanged=True)
+    find_story_files(catalog)
+
+    wait_for_jobs()
+    record_walked_levels()
+    report.close()
+    print_report(report)
+    print_errors(catalog)
+    catalog.save()
 
-    for fname, status in file_status.items():
-        print(f"{fname}: {status}")
+    finish()
         
     #print("Press any key to exit...")
     #msvcrt.getch()
\ No newline at end of file
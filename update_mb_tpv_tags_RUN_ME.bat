@@ -1,5 +1,5 @@
 @echo off
 pushd "%DROPBOX_TEAM%\Documents\Language\Chinese\mandarin blueprint\Phrase Vault"
-python "%DROPBOX_TEAM%\Documents\Language\Chinese\mandarin blueprint\scripts\update_mb_tpv_tags.py"
+python "%DROPBOX_TEAM%\Documents\Language\Chinese\mandarin blueprint\scripts\update_mb_tpv_tags.py" --cache "%DROPBOX_TEAM%\Documents\Language\Chinese\mandarin blueprint\.mb_tag_cache.sqlite"
 popd
 pause
\ No newline at end of file
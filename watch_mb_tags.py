@@ -0,0 +1,205 @@
+# /// script
+# requires-python = ">=3.8"
+# dependencies = [
+#     "mutagen",
+# ]
+# ///
+
+import os
+import time
+import threading
+import argparse
+from collections import defaultdict
+import update_mb_all_tags as all_tags
+from mb_tag_core import drain_jobs, add_arguments, configure, finish
+from mb_story_catalog import StoryCatalog, is_title_info
+
+try:
+    # optional: native file system events (inotify, ReadDirectoryChangesW, FSEvents)
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+except ImportError:
+    Observer = None
+
+# Keeps running and tags new or changed MP3/MP4 files as they arrive, with
+# the same rules as update_mb_all_tags.py. A burst of events for a file (a
+# download in progress) is collected until the file has been quiet for
+# --debounce seconds; then only the changed files of each directory are
+# classified and tagged. A changed TITLE INFO*.json re-tags the media of
+# its directory.
+
+MEDIA_EXTENSIONS = ('.mp3', '.mp4')
+
+def is_watched(name):
+    return name.lower().endswith(MEDIA_EXTENSIONS) or is_title_info(name)
+
+def stat_key(path):
+    st = os.stat(path)
+    return st.st_size, st.st_mtime_ns
+
+class ChangeQueue:
+    """Changed paths with the time of their last event; a path is released once it has been quiet."""
+
+    def __init__(self, debounce):
+        self.debounce = debounce
+        self.lock = threading.Lock()  # filled by the watchdog observer thread
+        self.changed = {}
+
+    def add(self, path):
+        if is_watched(os.path.basename(path)):
+            with self.lock:
+                self.changed[path] = time.monotonic()
+
+    def ready(self):
+        """Remove and return the paths without an event for the last debounce seconds."""
+        now = time.monotonic()
+        with self.lock:
+            paths = [path for path, last in self.changed.items() if now - last >= self.debounce]
+            for path in paths:
+                del self.changed[path]
+        return paths
+
+class PollingWatcher:
+    """Fallback without watchdog: compares size and mtime of the watched files every interval seconds."""
+
+    def __init__(self, root, queue, interval):
+        self.root = root
+        self.queue = queue
+        self.interval = interval
+        self.next_poll = time.monotonic() + interval
+        self.snapshot = self.scan()
+
+    def scan(self):
+        snapshot = {}
+        for root, dirs, files in os.walk(self.root):
+            dirs[:] = [d for d in dirs if d != ".git"]
+            for file in files:
+                if is_watched(file):
+                    path = os.path.join(root, file)
+                    try:
+                        snapshot[path] = stat_key(path)
+                    except OSError:
+                        pass  # removed while scanning
+        return snapshot
+
+    def poll(self):
+        if time.monotonic() < self.next_poll:
+            return
+        snapshot = self.scan()
+        for path, key in snapshot.items():
+            if self.snapshot.get(path) != key:
+                self.queue.add(path)
+        self.snapshot = snapshot
+        self.next_poll = time.monotonic() + self.interval
+
+def start_observer(root, queue):
+    """Start a watchdog observer that feeds created, modified and moved-in files to queue."""
+
+    class Handler(FileSystemEventHandler):
+        def on_any_event(self, event):
+            if event.is_directory or event.event_type not in ("created", "modified", "moved"):
+                return
+            path = getattr(event, "dest_path", None) or event.src_path
+            if os.sep + ".git" + os.sep not in path:
+                queue.add(path)
+
+    observer = Observer()
+    observer.schedule(Handler(), root, recursive=True)
+    observer.start()
+    return observer
+
+# path -> ((size, mtime_ns) right after it was tagged, time.monotonic() then), to
+# ignore our own writes; an entry goes once its event is seen, or after settle
+# seconds for a file whose check wrote nothing
+written = {}
+settle = 10.0  # set from --debounce and --interval
+
+def process_changes(paths):
+    """Tag the changed files, one directory listing at a time."""
+    now = time.monotonic()
+    for path in [path for path, (_, at) in written.items() if now - at > settle]:
+        del written[path]
+
+    by_dir = defaultdict(set)
+    for path in paths:
+        try:
+            key = stat_key(path)
+        except OSError:
+            continue  # deleted or moved away again
+        own = written.pop(path, None)
+        if own is None or own[0] != key:
+            by_dir[os.path.dirname(path)].add(os.path.basename(path))
+
+    # the results of all_tags are module lists; start each batch empty, as the daemon does per request
+    del all_tags.unmatched[:], all_tags.ambiguous[:]
+    all_tags.rule_counts.clear()
+    started = time.perf_counter()
+    tagged = []
+    for root, names in sorted(by_dir.items()):
+        files = [entry.name for entry in os.scandir(root) if entry.is_file()]
+        if any(is_title_info(name) for name in names):
+            media = sorted(file for file in files if file.lower().endswith(MEDIA_EXTENSIONS))
+        else:
+            media = sorted(name for name in names if name.lower().endswith(MEDIA_EXTENSIONS))
+        if not media:
+            continue
+
+        print(f"-| {root} | -")  # current directory path
+        unmatched = len(all_tags.unmatched)
+        try:
+            all_tags.process_listing(root, files, media)
+            drain_jobs()
+        except Exception as e:
+            # e.g. a file that is still being written; its next change queues it again
+            print(f"#### ---- Error in [{root}]: error [{e}]")
+        for full_path in all_tags.unmatched[unmatched:]:
+            print(f"Skipping {os.path.basename(full_path)}: matches no rule")
+        tagged.extend(os.path.join(root, file) for file in media)
+
+    now = time.monotonic()
+    for path in tagged:
+        try:
+            written[path] = (stat_key(path), now)
+        except OSError:
+            pass
+    all_tags.catalog.save()
+    if tagged:
+        print(f">> {len(tagged)} file(s) checked in {time.perf_counter() - started:.2f} s, watching...")
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser()
+    p.add_argument("scan_dir", help="library folder to watch for MP3, MP4 and TITLE INFO files", nargs="?", default='.', type=str)
+    p.add_argument("--debounce", help="seconds a file must be unchanged before it is tagged", default=2.0, type=float)
+    p.add_argument("--poll", help="poll for changes instead of using file system events", action="store_true")
+    p.add_argument("--interval", help="seconds between two polls", default=5.0, type=float)
+    add_arguments(p)
+    args = p.parse_args()
+    configure(args, "all")
+    all_tags.catalog = StoryCatalog(args.scan_dir)
+
+    queue = ChangeQueue(args.debounce)
+    observer = poller = None
+    if Observer is not None and not args.poll:
+        observer = start_observer(args.scan_dir, queue)
+        how = "file system events"
+    else:
+        poller = PollingWatcher(args.scan_dir, queue, args.interval)
+        how = f"polling every {args.interval:g} s" + ("" if args.poll else "; install watchdog for file system events")
+    settle = max(settle, 2 * (args.debounce + (args.interval if poller is not None else 0)))
+    print(f"Watching [{args.scan_dir}] for new or changed MP3, MP4 and TITLE INFO files ({how}), Ctrl+C to stop")
+
+    try:
+        while True:
+            if poller is not None:
+                poller.poll()
+            paths = queue.ready()
+            if paths:
+                process_changes(paths)
+            time.sleep(0.2)
+    except KeyboardInterrupt:
+        print("Stopped watching")
+    finally:
+        if observer is not None:
+            observer.stop()
+            observer.join()
+        finish()
@@ -0,0 +1,5 @@
+@echo off
+pushd "%DROPBOX_TEAM%\Documents\Language\Chinese\mandarin blueprint"
+python "scripts\watch_mb_tags.py" %*
+popd
+pause
\ No newline at end of file